@@ -59,6 +59,20 @@ Programming: An Introduction to Computer Science" by John Zelle,
 published by Franklin, Beedle & Associates.  Also see
 http://mcsp.wartburg.edu/zelle/python for a quick reference"""
 
+# Changes for WTP Tetris
+#     _reconfig only sends Tk the option that changed, and only if its
+#        value is different. Added setConfig, deferConfig and flushConfig
+#        to GraphicsObject to change several options with one Tk call.
+#     getMouse waits on a Tk variable written by the click instead of
+#        polling every 0.1 seconds, and checkMouse handles the pending
+#        events and then the idle redraws instead of doing a full update.
+#     Added setPixels and getPixels to Pixmap to write and read a
+#        region of RGB bytes with one Tk call. getPixel reads from a
+#        copy of the pixels made on first use.
+#     plot and plotPixel draw into one image covering the window instead
+#        of making a canvas item per pixel. Added plotPoints and
+#        plotPixels to set many pixels with one Tk call, and clearPlot.
+#
 # Version 3.5 5/10/09
 # Removed all the threading crap and cleaned up the _root stuff
 #
@@ -126,8 +140,9 @@ http://mcsp.wartburg.edu/zelle/python for a quick reference"""
 #     Added ability to set text atttributes.
 #     Added Entry boxes.
 
-import time, os, sys
+import time, os, sys, binascii, itertools
 import Tkinter
+import _tkinter
 tk = Tkinter
 
 
@@ -169,12 +184,18 @@ class CanvasFrame(tk.Frame):
         self.mouseX = None
         self.mouseY = None
         self.canvas.bind("<Button-1>", self._onClick)
+        self.canvas.bind("<Destroy>", self._onDestroy)
+        # written on every click and when the window goes away,
+        # so getMouse can wait on it
+        self.mouseEvent = tk.IntVar(parent)
         self.height = height
         self.width = width
         self._mouseCallback = None
         self._keyboardCallback = None
         self.trans = None
         self.closed = False
+        # the image plotted pixels are drawn into, made on first use
+        self.plotImage = None
         parent.lift()
 
     def __checkOpen(self):
@@ -205,15 +226,51 @@ class CanvasFrame(tk.Frame):
     
     def plot(self, x, y, color="black"):
         """Set pixel (x,y) to the given color"""
-        self.__checkOpen()
-        xs,ys = self.toScreen(x,y)
-        self.create_line(xs,ys,xs+1,ys, fill=color)
+        self.plotPoints([(x,y)], color)
         
     def plotPixel(self, x, y, color="black"):
         """Set pixel raw (independent of window coordinates) pixel
         (x,y) to color"""
+        self.plotPixels([(x,y)], color)
+
+    def plotPoints(self, points, colors="black"):
+        """Set many pixels at once. points is a sequence of (x,y) in
+        window coordinates, colors one color for all of them or a
+        sequence with the color of each point"""
+        toScreen = self.toScreen
+        self.plotPixels([toScreen(x,y) for x,y in points], colors)
+
+    def plotPixels(self, points, colors="black"):
+        """Set many raw pixels at once, like plotPoints but with (x,y)
+        independent of window coordinates.
+        The pixels are drawn into one image that covers the window, so
+        they are a single canvas item however many there are, and they
+        are sent to Tk in one call. clearPlot removes them all."""
+        self.__checkOpen()
+        if self.plotImage is None:
+            self.plotImage = tk.PhotoImage(master=self.canvas,
+                                           width=self.width, height=self.height)
+            self.canvas.create_image(0, 0, image=self.plotImage, anchor="nw")
+        if isinstance(colors, basestring):
+            colors = itertools.repeat(colors)
+        name = self.plotImage.name
+        width = self.width
+        height = self.height
+        script = []
+        for (x,y), color in itertools.izip(points, colors):
+            x = int(x)
+            y = int(y)
+            if 0 <= x < width and 0 <= y < height:
+                script.append("%s put {{%s}} -to %d %d" % (name, color, x, y))
+        if script:
+            self.plotImage.tk.eval("\n".join(script))
+
+    def clearPlot(self):
+        """Remove every pixel set by plot, plotPixel, plotPoints
+        and plotPixels"""
         self.__checkOpen()
-        self.create_line(x,y,x+1,y, fill=color)
+        if self.plotImage is not None:
+            self.plotImage.blank()
         
     def flush(self):
         """Update drawing to the window"""        
@@ -226,9 +283,10 @@ class CanvasFrame(tk.Frame):
         self.mouseX = None
         self.mouseY = None
         while self.mouseX == None or self.mouseY == None:
-            self.update()
             if self.isClosed(): raise GraphicsError, "getMouse in closed window"
-            time.sleep(.1) # give up thread
+            # handles events, redraws included, until a click
+            # or the window closing writes mouseEvent
+            self.canvas.wait_variable(self.mouseEvent)
         x,y = self.toWorld(self.mouseX, self.mouseY)
         self.mouseX = None
         self.mouseY = None
@@ -239,7 +297,15 @@ class CanvasFrame(tk.Frame):
         not been clicked since last call"""
         if self.isClosed():
             raise GraphicsError, "checkMouse in closed window"
-        self.update()
+        # handle the events already waiting without blocking, then
+        # the idle callbacks, which redraw only what changed, so
+        # objects moved between calls still show
+        dooneevent = self.canvas.tk.dooneevent
+        flags = _tkinter.DONT_WAIT | (_tkinter.ALL_EVENTS & ~_tkinter.IDLE_EVENTS)
+        while dooneevent(flags):
+            pass
+        if not self.isClosed():
+            self.canvas.update_idletasks()
         if self.mouseX != None and self.mouseY != None:
             x,y = self.toWorld(self.mouseX, self.mouseY)
             self.mouseX = None
@@ -276,9 +342,14 @@ class CanvasFrame(tk.Frame):
     def _onClick(self, e):
         self.mouseX = e.x
         self.mouseY = e.y
+        self.mouseEvent.set(self.mouseEvent.get() + 1)
         if self._mouseCallback:
             self._mouseCallback(Point(e.x, e.y))
 
+    def _onDestroy(self, e):
+        self.closed = True
+        self.mouseEvent.set(self.mouseEvent.get() + 1)
+
 
 class Transform:
 
@@ -339,6 +410,9 @@ class GraphicsObject:
         for option in options:
             config[option] = DEFAULT_CONFIG[option]
         self.config = config
+
+        # options changed since deferConfig, None when not deferring
+        self._pending = None
         
     def setFill(self, color):
         """Set interior color to color"""
@@ -352,6 +426,35 @@ class GraphicsObject:
         """Set line weight to width"""
         self._reconfig("width", width)
 
+    def setConfig(self, **options):
+        """Set several options at once, e.g.
+        setConfig(fill="red", outline="blue"). The options that changed
+        are sent to Tk in a single call"""
+        deferring = self._pending is not None
+        self.deferConfig()
+        try:
+            for option, setting in options.items():
+                self._reconfig(option, setting)
+        finally:
+            # even if an option was refused, so later changes are not
+            # held back for good
+            if not deferring:
+                self.flushConfig()
+
+    def deferConfig(self):
+        """Hold back option changes (setFill, setText, ...) until
+        flushConfig is called"""
+        if self._pending is None:
+            self._pending = {}
+
+    def flushConfig(self):
+        """Send the options changed since deferConfig to Tk in a single
+        call and stop deferring"""
+        pending = self._pending
+        self._pending = None
+        if pending and self.canvas_frame and not self.canvas_frame.isClosed():
+            self.canvas_frame.canvas.itemconfig(self.id, pending)
+
     def draw(self, canvas_frame):
 
         """Draw the object in CanvasFrame, which should be a CanvasFrame
@@ -396,12 +499,18 @@ class GraphicsObject:
         # Internal method for changing configuration of the object
         # Raises an error if the option does not exist in the config
         #    dictionary for this object
+        # Only the changed option is sent to Tk, or held back while
+        #    deferring (see deferConfig)
         if not self.config.has_key(option):
             raise GraphicsError, UNSUPPORTED_METHOD
         options = self.config
+        if options[option] == setting:
+            return
         options[option] = setting
-        if self.canvas_frame and not self.canvas_frame.isClosed():
-            self.canvas_frame.canvas.itemconfig(self.id, options)
+        if self._pending is not None:
+            self._pending[option] = setting
+        elif self.canvas_frame and not self.canvas_frame.isClosed():
+            self.canvas_frame.canvas.itemconfig(self.id, {option: setting})
 
     def _draw(self, canvas_frame, options):
         """draws appropriate figure on canvas with options provided
@@ -769,6 +878,8 @@ class Pixmap:
             width, height = args
             self.image = tk.PhotoImage( master=_root,
                                 width=width, height=height)
+        # r,g,b bytes of every pixel, read from Tk by getPixel
+        self._pixels = None
     
     def getWidth(self):
         """Returns the width of the image in pixels"""
@@ -782,13 +893,19 @@ class Pixmap:
         """Returns a list [r,g,b] with the RGB color values for pixel (x,y)
         r,g,b are in range(256)
 
+        The first call reads the whole image from Tk, later calls
+        use that copy. Call forgetPixels if the image is changed
+        other than through this Pixmap.
+
         """
         
-        value = self.image.get( x,y)
-        if type(value) ==  int:
-            return [value, value, value]
-        else:
-            return map(int, value.split()) 
+        width = self.getWidth()
+        if not (0 <= x < width and 0 <= y < self.getHeight()):
+            raise GraphicsError, "pixel (%d, %d) is outside the image" % (x, y)
+        if self._pixels is None:
+            self._pixels = self.getPixels()
+        i = (y * width + x) * 3
+        return list(self._pixels[i:i+3])
 
     def setPixel(self, x, y, (r,g,b)):
         """Sets pixel (x,y) to the color given by RGB values r, g, and b.
@@ -797,6 +914,76 @@ class Pixmap:
         """
         
         self.image.put( "{%s}"%color_rgb(r,g,b), (x, y))
+        if self._pixels is not None:
+            width = self.getWidth()
+            if 0 <= x < width and 0 <= y < self.getHeight():
+                i = (y * width + x) * 3
+                self._pixels[i:i+3] = bytearray((r,g,b))
+            else:
+                self._pixels = None
+
+    def getPixels(self, x=0, y=0, width=None, height=None):
+        """Returns a bytearray with the r,g,b values of the pixels in the
+        width by height region with its upper left corner at (x,y),
+        row after row. The region is read from Tk with one call. By
+        default it reaches the right and bottom edges of the image.
+
+        """
+        
+        if width is None:
+            width = self.getWidth() - x
+        if height is None:
+            height = self.getHeight() - y
+        if width <= 0 or height <= 0:
+            return bytearray()
+        data = self.image.tk.eval("%s data -from %d %d %d %d" %
+                                  (self.image.name, x, y, x+width, y+height))
+        # rows of #rrggbb colors, e.g. "{#ff0000 #00ff00} {...}"
+        return bytearray(binascii.unhexlify("".join(data.translate(None, "{}#").split())))
+
+    def setPixels(self, data, x=0, y=0, width=None):
+        """Sets the pixels of a region with its upper left corner at (x,y)
+        from data, a contiguous buffer of r,g,b bytes row after row: a
+        str, bytearray, array("B") or a NumPy array of uint8. width is
+        the width of the region in pixels, by default up to the right
+        edge of the image, and the height follows from the length of
+        data. The region is sent to Tk with one put.
+
+        """
+        
+        if width is None:
+            width = self.getWidth() - x
+        hexed = binascii.hexlify(buffer(data))
+        rowLength = width * 6
+        if rowLength <= 0 or len(hexed) % rowLength:
+            raise GraphicsError, "pixel data is not a whole number of %d pixel rows" % width
+        rows = []
+        for start in xrange(0, len(hexed), rowLength):
+            row = hexed[start:start+rowLength]
+            rows.append("{#%s}" % " #".join([row[i:i+6] for i in xrange(0, rowLength, 6)]))
+        self.image.put(" ".join(rows), (x, y))
+
+        pixels = self._pixels
+        if pixels is not None:
+            imageWidth = self.getWidth()
+            imageHeight = self.getHeight()
+            height = len(rows)
+            if (x < 0 or y < 0 or x + width > imageWidth or y + height > imageHeight
+                or len(pixels) != imageWidth * imageHeight * 3):
+                # the region is not all inside the image, or the put made
+                # the image grow: read it again when needed
+                self._pixels = None
+            else:
+                data = bytearray(buffer(data))
+                rowBytes = width * 3
+                for row in xrange(height):
+                    i = ((y + row) * imageWidth + x) * 3
+                    pixels[i:i+rowBytes] = data[row*rowBytes:(row+1)*rowBytes]
+
+    def forgetPixels(self):
+        """Drops the copy of the pixels getPixel reads from, so the next
+        getPixel reads the image from Tk again."""
+        self._pixels = None
 
     def clone(self):
         """Returns a copy of this Pixmap"""
@@ -0,0 +1,306 @@
+import time
+
+import tetris_engine
+
+
+############################################################
+# HEURISTIC CLASS
+############################################################
+
+class Heuristic(object):
+    ''' Heuristic class: scores a board after a placement as a weighted
+        sum of its features. Higher is better
+        Attributes: weights - type: dictionary - feature name to weight
+
+        The features are 'aggregate_height', 'lines', 'holes',
+        'bumpiness' and 'max_height'. Any object with an
+        evaluate(board, lines) method can be used in its place
+    '''
+
+    WEIGHTS = {'aggregate_height': -0.510066,
+               'lines': 0.760666,
+               'holes': -0.35663,
+               'bumpiness': -0.184483,
+               'max_height': 0.0}
+
+    def __init__(self, weights=None):
+        self.weights = dict(self.WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+
+    def features(self, board, lines):
+        ''' Parameters: board - type: tetris_engine.Board
+                        lines - type: int - rows removed by the placement
+            Return value: type: dictionary
+
+            the value of each feature for the board
+        '''
+        return {'aggregate_height': board.aggregate_height(),
+                'lines': lines,
+                'holes': board.holes(),
+                'bumpiness': board.bumpiness(),
+                'max_height': board.max_height()}
+
+    def evaluate(self, board, lines):
+        ''' Parameters: board - type: tetris_engine.Board
+                        lines - type: int - rows removed by the placement
+            Return value: type: float
+        '''
+        weights = self.weights
+        total = 0.0
+        for name, value in self.features(board, lines).items():
+            total += weights.get(name, 0.0) * value
+        return total
+
+
+############################################################
+# PLACEMENT CLASS
+############################################################
+
+class Placement(object):
+    ''' Placement class: one way to put a shape down
+        Attributes: actions - type: list - the key names that put the shape
+                              there, ending with the hard drop 'space'
+                    board - type: tetris_engine.Board - the board after the
+                            shape is added and the complete rows removed
+                    lines - type: int - the number of rows removed
+                    topped_out - type: bool - whether part of the shape
+                                 was left above the top of the board
+                    score - type: float - set by AIPlayer
+    '''
+
+    def __init__(self, actions, board, lines, topped_out):
+        self.actions = actions
+        self.board = board
+        self.lines = lines
+        self.topped_out = topped_out
+        self.score = None
+
+
+def placements(board, shape):
+    ''' Parameters: board - type: tetris_engine.Board
+                    shape - type: tetris_engine.Shape
+        Return value: type: list - of Placement
+
+        every placement reachable from the current position of shape
+        by rotating in place, then sliding sideways, then a hard drop
+    '''
+    result = []
+    probe = shape.copy()
+    turns = 0
+    while True:
+        for dx in slides(board, probe):
+            if dx < 0:
+                actions = ['Up'] * turns + ['Left'] * -dx + ['space']
+            else:
+                actions = ['Up'] * turns + ['Right'] * dx + ['space']
+
+            placed = probe.copy()
+            placed.move(dx, 0)
+            placed.move(0, placed.drop_distance(board))
+            after = board.copy()
+            after.add_shape(placed)
+            lines = len(after.remove_complete_rows())
+            topped_out = min([cell.y for cell in placed.get_blocks()]) < 0
+            result.append(Placement(actions, after, lines, topped_out))
+
+        turns += 1
+        if turns >= len(probe.ORIENTATIONS) or not probe.can_rotate(board):
+            return result
+        probe.rotate(board)
+
+
+def slides(board, shape):
+    ''' Parameters: board - type: tetris_engine.Board
+                    shape - type: tetris_engine.Shape
+        Return value: type: list - of int
+
+        the sideways offsets shape can reach from where it is
+    '''
+    offsets = [0]
+    for step in (-1, 1):
+        dx = step
+        while shape.can_move(board, dx, 0):
+            offsets.append(dx)
+            dx += step
+    return offsets
+
+
+############################################################
+# LRU CACHE CLASS
+############################################################
+
+class LRUCache(object):
+    ''' LRUCache class: remembers a bounded number of results, forgetting
+        the least recently used ones first.
+        The results are kept in two plain dictionaries, so a lookup costs
+        about as much as a dictionary lookup: new results go into recent,
+        and a result found in old is moved back into recent. When recent
+        holds half of size results, old is dropped and recent becomes old
+        Attributes: size - type: int - the most results kept
+                    recent, old - type: dictionary - the results
+                    hits, misses - type: int - how many lookups found a
+                                   result and how many did not
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.recent = {}
+        self.old = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        ''' Parameter: key - a hashable value
+            Return value: the result stored for key, or None
+        '''
+        value = self.recent.get(key)
+        if value is None:
+            value = self.old.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self.put(key, value)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        ''' Parameters: key - a hashable value
+                        value - the result to store, not None
+
+            stores value for key, forgetting the least recently used
+            results if the cache is full
+        '''
+        recent = self.recent
+        recent[key] = value
+        if len(recent) * 2 >= self.size:
+            self.old = recent
+            self.recent = {}
+
+    def clear(self):
+        ''' forgets every result
+        '''
+        self.recent = {}
+        self.old = {}
+
+
+############################################################
+# AI PLAYER CLASS
+############################################################
+
+class AIPlayer(object):
+    ''' AIPlayer class: chooses where to put each shape
+        Attributes: heuristic - type: Heuristic - scores the placements
+                    time_budget - type: float - seconds to spend on each shape,
+                                  or None for no limit
+                    lookahead - type: bool - whether to also place the next
+                                shape, when it is known
+                    evaluations - type: LRUCache - heuristic scores by board
+                                  hash and lines, or None
+                    best_scores - type: LRUCache - best_score results by board
+                                  hash, shape and lines, or None
+
+        With cache_size set, boards that were seen before are not
+        evaluated again. Within one choose the same board rarely comes
+        up twice, so this pays off when positions repeat, e.g. when a
+        game is rolled back with TetrisEngine.restore and played again.
+        Call clear_cache after changing the heuristic
+    '''
+
+    def __init__(self, heuristic=None, time_budget=0.05, lookahead=True,
+                 cache_size=None):
+        if heuristic is None:
+            heuristic = Heuristic()
+        self.heuristic = heuristic
+        self.time_budget = time_budget
+        self.lookahead = lookahead
+        self.evaluations = None
+        self.best_scores = None
+        if cache_size:
+            self.evaluations = LRUCache(cache_size)
+            self.best_scores = LRUCache(cache_size)
+
+    def clear_cache(self):
+        ''' forgets every cached score
+        '''
+        if self.evaluations is not None:
+            self.evaluations.clear()
+            self.best_scores.clear()
+
+    def score(self, placement, lines):
+        ''' Parameters: placement - type: Placement
+                        lines - type: int - rows removed so far, this placement included
+            Return value: type: float
+        '''
+        if placement.topped_out:
+            return float('-inf')
+        cache = self.evaluations
+        if cache is None:
+            return self.heuristic.evaluate(placement.board, lines)
+
+        key = (placement.board.zobrist, lines)
+        value = cache.get(key)
+        if value is None:
+            value = self.heuristic.evaluate(placement.board, lines)
+            cache.put(key, value)
+        return value
+
+    def choose(self, board, shape, next_shapes=()):
+        ''' Parameters: board - type: tetris_engine.Board
+                        shape - type: tetris_engine.Shape - the shape to place
+                        next_shapes - type: list - the Shape classes coming next,
+                                      if known
+            Return value: type: list - the actions of the best placement
+
+            scores every placement of shape. With lookahead and a known
+            next shape, the best placements are then refined by also
+            placing the next shape on the resulting board, until the
+            time budget runs out
+        '''
+        deadline = None
+        if self.time_budget is not None:
+            deadline = time.time() + self.time_budget
+        candidates = placements(board, shape)
+        for placement in candidates:
+            placement.score = self.score(placement, placement.lines)
+        candidates.sort(key=lambda placement: placement.score, reverse=True)
+        best = candidates[0]
+
+        if not self.lookahead or not next_shapes:
+            return best.actions
+
+        best_total = None
+        for placement in candidates:
+            if placement.topped_out:
+                break
+            if deadline is not None and time.time() > deadline:
+                break
+            total = self.best_score(placement.board, next_shapes[0], placement.lines)
+            if best_total is None or total > best_total:
+                best, best_total = placement, total
+        return best.actions
+
+    def best_score(self, board, shape_class, lines):
+        ''' Parameters: board - type: tetris_engine.Board
+                        shape_class - type: Shape class
+                        lines - type: int - rows removed by the earlier placement
+            Return value: type: float
+
+            the score of the best placement of a new shape_class on board
+        '''
+        cache = self.best_scores
+        if cache is not None:
+            key = (board.zobrist, shape_class.ID, lines)
+            value = cache.get(key)
+            if value is not None:
+                return value
+
+        shape = tetris_engine.spawn_shape(shape_class, board)
+        if not shape.can_move(board, 0, 0):
+            value = float('-inf')
+        else:
+            value = max([self.score(placement, lines + placement.lines)
+                         for placement in placements(board, shape)])
+        if cache is not None:
+            cache.put(key, value)
+        return value
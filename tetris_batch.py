@@ -0,0 +1,380 @@
+''' Plays many games of WTP Tetris at once on NumPy arrays, by the rules
+    of tetris_engine.TetrisEngine.
+
+        python tetris_batch.py
+
+    checks that it does: it plays the same games on a BatchEngine and
+    on TetrisEngines and exits with status 1 if any of them went
+    differently.
+'''
+
+import sys
+
+import numpy
+
+import tetris_ai
+import tetris_engine
+
+
+############################################################
+# ACTIONS
+############################################################
+
+# action codes for BatchEngine.step, in the order of the key names
+# TetrisEngine.step accepts. Any other code is a no-op
+ACTIONS = ['Left', 'Right', 'Down', 'Up', 'space']
+LEFT, RIGHT, DOWN, ROTATE, DROP = range(len(ACTIONS))
+NOOP = -1
+
+
+def build_tables(shapes):
+    ''' Parameter: shapes - type: list (list of Shape classes)
+        Return value: type: tuple - (offsets, next_orientation)
+
+        offsets[s, o] holds the (dx, dy) of the 4 blocks of shape s in
+        orientation o, and next_orientation[s, o] the orientation it
+        rotates into. Shapes with fewer than 4 orientations repeat them,
+        and shapes that do not rotate map every orientation to itself
+    '''
+    offsets = numpy.zeros((len(shapes), 4, 4, 2), dtype=numpy.int64)
+    next_orientation = numpy.zeros((len(shapes), 4), dtype=numpy.int64)
+    for s, shape_class in enumerate(shapes):
+        count = len(shape_class.ORIENTATIONS)
+        for o in range(4):
+            offsets[s, o] = shape_class.ORIENTATIONS[o % count].offsets
+            if shape_class.ROTATES:
+                next_orientation[s, o] = (o + 1) % count
+            else:
+                next_orientation[s, o] = o
+    return offsets, next_orientation
+
+
+############################################################
+# BATCH ENGINE CLASS
+############################################################
+
+class BatchEngine(object):
+    ''' BatchEngine class: runs n independent games in lockstep.
+        Every game follows the rules of tetris_engine.TetrisEngine, but
+        all boards live in one NumPy array and each step applies the
+        actions of every game with a handful of array operations
+        Attributes:
+            n - type:int - the number of games
+            width, height - type:int - the size of each board in squares
+            boards - type:ndarray (n, height, width) - 0 for an empty square,
+                     otherwise 1 + the index in SHAPES of the shape that filled it
+            shape, orientation, x, y - type:ndarray (n,) - the current shape
+                     of each game: index in SHAPES, orientation index and
+                     the square of its center block
+            score, level, delay - type:ndarray (n,) - as in TetrisEngine
+            over - type:ndarray (n,) of bool - whether each game has ended
+            rng - type:numpy.random.RandomState - picks the new shapes
+            pieces - type:list - a tetris_engine.PieceGenerator per game
+                     that deals its shapes instead of rng, or None
+    '''
+
+    SHAPES = tetris_engine.SHAPES
+    OFFSETS, NEXT_ORIENTATION = build_tables(SHAPES)
+    # the index in SHAPES of each Shape class
+    SHAPE_INDEX = dict([(shape_class, i) for i, shape_class in enumerate(SHAPES)])
+    LEVEL_LIMITS = numpy.array([limit for limit, delay in tetris_engine.TetrisEngine.LEVELS])
+    LEVEL_DELAYS = numpy.array([delay for limit, delay in tetris_engine.TetrisEngine.LEVELS])
+
+    def __init__(self, n, width=tetris_engine.TetrisEngine.BOARD_WIDTH,
+                 height=tetris_engine.TetrisEngine.BOARD_HEIGHT, seed=None, pieces=None):
+        self.n = n
+        self.width = width
+        self.height = height
+        self.rng = numpy.random.RandomState(seed)
+        # with pieces, game i gets the same shapes as a TetrisEngine
+        # using pieces[i]; reset does not replace them
+        self.pieces = pieces
+
+        self.boards = numpy.zeros((n, height, width), dtype=numpy.uint8)
+        self.shape = numpy.zeros(n, dtype=numpy.int64)
+        self.orientation = numpy.zeros(n, dtype=numpy.int64)
+        self.x = numpy.zeros(n, dtype=numpy.int64)
+        self.y = numpy.zeros(n, dtype=numpy.int64)
+        self.score = numpy.zeros(n, dtype=numpy.int64)
+        self.level = numpy.zeros(n, dtype=numpy.int64)
+        self.delay = numpy.zeros(n, dtype=numpy.int64)
+        self.over = numpy.zeros(n, dtype=bool)
+        self.reset()
+
+    def reset(self, games=None):
+        ''' Parameter: games - type: array of int - the games to restart,
+                       or None for all of them
+
+            empties the boards of the given games, sets their score back
+            to 0 and spawns a new shape on each
+        '''
+        if games is None:
+            games = numpy.arange(self.n)
+        games = numpy.asarray(games, dtype=numpy.int64)
+        self.boards[games] = 0
+        self.score[games] = 0
+        self.over[games] = False
+        self.update_levels(games)
+        self.spawn(games)
+
+    def random_shapes(self, count):
+        ''' Parameter: count - type: int
+            Return value: type: ndarray of int
+
+            picks count random indexes into SHAPES
+        '''
+        return self.rng.randint(0, len(self.SHAPES), size=count)
+
+    def spawn(self, games):
+        ''' Parameter: games - type: array of int
+
+            gives each of the given games a new random shape
+            centered at the top center of the board
+        '''
+        if self.pieces is None:
+            self.shape[games] = self.random_shapes(len(games))
+        else:
+            self.shape[games] = [self.SHAPE_INDEX[self.pieces[game].next_shape()]
+                                 for game in games]
+        self.orientation[games] = 0
+        self.x[games] = self.width // 2 - 1
+        self.y[games] = 0
+
+    def update_levels(self, games):
+        ''' Parameter: games - type: array of int
+
+            sets level and delay of the given games from their score,
+            as tetris_engine.level_for_score does
+        '''
+        level = numpy.searchsorted(self.LEVEL_LIMITS, self.score[games], side='right')
+        level = numpy.minimum(level, len(self.LEVEL_LIMITS) - 1)
+        self.level[games] = level + 1
+        self.delay[games] = self.LEVEL_DELAYS[level]
+
+    def cells(self, games, orientation, x, y):
+        ''' Parameters: games - type: array of int
+                        orientation, x, y - type: array of int - one per game
+            Return value: type: tuple - (xs, ys), each of shape (len(games), 4)
+
+            the squares covered by the current shape of each game
+            in the given orientation with its center block at x, y
+        '''
+        offsets = self.OFFSETS[self.shape[games], orientation]
+        return (x[:, None] + offsets[:, :, 0],
+                y[:, None] + offsets[:, :, 1])
+
+    def fits(self, games, orientation, x, y):
+        ''' Parameters: games - type: array of int
+                        orientation, x, y - type: array of int - one per game
+            Return value: type: ndarray of bool
+
+            checks, for each game, if its current shape fits on its board.
+            Squares above the top of the board are always free
+        '''
+        xs, ys = self.cells(games, orientation, x, y)
+        inside = (xs >= 0) & (xs < self.width) & (ys < self.height)
+        filled = self.boards[games[:, None],
+                             ys.clip(0, self.height - 1),
+                             xs.clip(0, self.width - 1)] != 0
+        return (inside & ~(filled & (ys >= 0))).all(axis=1)
+
+    def drop_distance(self, games):
+        ''' Parameter: games - type: array of int
+            Return value: type: ndarray of int
+
+            how many squares the current shape of each game can fall:
+            the distance from each block to the first filled square
+            below it in its column, minimised over the blocks
+        '''
+        xs, ys = self.cells(games, self.orientation[games],
+                            self.x[games], self.y[games])
+        columns = self.boards[games[:, None], :, xs] != 0
+        rows = numpy.arange(self.height)
+        below = columns & (rows > ys[:, :, None])
+        first = numpy.where(below.any(axis=2), below.argmax(axis=2), self.height)
+        return (first - ys - 1).min(axis=1)
+
+    def step(self, actions):
+        ''' Parameters: actions - type: array of int - one action code per game
+            Return value: type: tuple - (rows cleared, game over), both
+                          arrays with one entry per game
+
+            applies one action to every game, exactly as TetrisEngine.step
+            would. Games that are over ignore their action
+        '''
+        actions = numpy.asarray(actions)
+        playing = ~self.over
+        locking = []
+
+        for code, dx, dy in ((LEFT, -1, 0), (RIGHT, 1, 0), (DOWN, 0, 1)):
+            games = numpy.nonzero(playing & (actions == code))[0]
+            if len(games):
+                moved = self.fits(games, self.orientation[games],
+                                  self.x[games] + dx, self.y[games] + dy)
+                self.x[games[moved]] += dx
+                self.y[games[moved]] += dy
+                if code == DOWN:
+                    locking.append(games[~moved])
+
+        games = numpy.nonzero(playing & (actions == ROTATE))[0]
+        if len(games):
+            orientation = self.NEXT_ORIENTATION[self.shape[games], self.orientation[games]]
+            rotated = self.fits(games, orientation, self.x[games], self.y[games])
+            self.orientation[games[rotated]] = orientation[rotated]
+
+        games = numpy.nonzero(playing & (actions == DROP))[0]
+        if len(games):
+            self.y[games] += self.drop_distance(games)
+            locking.append(games)
+
+        cleared = numpy.zeros(self.n, dtype=numpy.int64)
+        if locking:
+            games = numpy.concatenate(locking)
+            if len(games):
+                self.lock_shapes(games, cleared)
+        return cleared, self.over.copy()
+
+    def lock_shapes(self, games, cleared):
+        ''' Parameters: games - type: array of int
+                        cleared - type: ndarray - receives the rows cleared per game
+
+            for each of the given games:
+            1. add the current shape to the board
+            2. spawn a new random shape
+            3. if it does not fit on the board, the game is over
+            4. remove the completed rows if any
+        '''
+        xs, ys = self.cells(games, self.orientation[games],
+                            self.x[games], self.y[games])
+        visible = ys >= 0
+        colors = numpy.repeat(self.shape[games] + 1, 4).reshape(xs.shape)
+        owners = numpy.repeat(games, 4).reshape(xs.shape)
+        self.boards[owners[visible], ys[visible], xs[visible]] = colors[visible]
+
+        self.spawn(games)
+        fits = self.fits(games, self.orientation[games], self.x[games], self.y[games])
+        self.over[games[~fits]] = True
+        games = games[fits]
+        if len(games):
+            cleared[games] = self.remove_complete_rows(games)
+
+    def remove_complete_rows(self, games):
+        ''' Parameter: games - type: array of int
+            Return value: type: ndarray of int - the rows removed per game
+
+            removes all the complete rows of the given boards and moves
+            the rows above them down, then updates score and level
+        '''
+        full = (self.boards[games] != 0).all(axis=2)
+        counts = full.sum(axis=1)
+        hit = counts > 0
+        if not hit.any():
+            return counts
+
+        games = games[hit]
+        full = full[hit]
+        # a stable sort puts the complete rows on top, keeping the order
+        # of the others; the complete rows are then emptied
+        order = numpy.argsort(~full, axis=1, kind='stable')
+        boards = numpy.take_along_axis(self.boards[games], order[:, :, None], axis=1)
+        boards[numpy.arange(self.height) < counts[hit][:, None]] = 0
+        self.boards[games] = boards
+
+        self.score[games] += counts[hit]
+        self.update_levels(games)
+        return counts
+
+
+############################################################
+# CHECK
+############################################################
+
+# the games and steps of check; every CHECK_AI_EVERY-th game is played
+# by the AI, so rows get cleared and levels go up, the others by random
+# actions, so games end and are started again
+CHECK_GAMES = 200
+CHECK_STEPS = 1000
+CHECK_AI_EVERY = 4
+
+
+def check(games=CHECK_GAMES, steps=CHECK_STEPS, seed=0):
+    ''' Parameters: games - type: int - how many games to play at once
+                    steps - type: int - actions to apply to each game
+                    seed - type: int - seeds the actions and the shapes
+        Return value: type: list - of strings, one for each game that
+                      went differently on the two engines
+
+        plays the same actions on a BatchEngine and on one TetrisEngine per
+        game, chosen by the AI or at random. The batch games are dealt the
+        shapes of the PieceGenerator their TetrisEngine uses. A game that
+        is over is started again on both engines with a new seed. After
+        every step the boards, the current shapes, scores, levels, delays
+        and game overs must match
+    '''
+    index = BatchEngine.SHAPE_INDEX
+    seeds = iter(xrange(seed, sys.maxint))
+    game_seeds = [next(seeds) for game in range(games)]
+    engines = [tetris_engine.TetrisEngine(seed=game_seed) for game_seed in game_seeds]
+    pieces = [tetris_engine.PieceGenerator(game_seed) for game_seed in game_seeds]
+
+    batch = BatchEngine(games, pieces=pieces)
+
+    player = tetris_ai.AIPlayer(time_budget=None, lookahead=False)
+    plans = [[] for game in range(games)]
+    codes = dict([(action, code) for code, action in enumerate(ACTIONS)])
+
+    rng = numpy.random.RandomState(seed)
+    failed = {}
+    for step in xrange(steps):
+        actions = rng.randint(0, len(ACTIONS), size=games)
+        for game in xrange(0, games, CHECK_AI_EVERY):
+            if game not in failed and not engines[game].over:
+                if not plans[game]:
+                    plans[game] = player.choose(engines[game].board,
+                                                engines[game].current_shape)
+                actions[game] = codes[plans[game].pop(0)]
+        cleared, over = batch.step(actions)
+        for game in xrange(games):
+            if game in failed:
+                continue
+            engine = engines[game]
+            lines = engine.step(ACTIONS[actions[game]])[0]
+            shape = engine.current_shape
+            differences = []
+            if batch.boards[game].tobytes() != bytes(engine.board.colors):
+                differences.append('board')
+            if ((batch.shape[game], batch.orientation[game], batch.x[game], batch.y[game]) !=
+                (index[shape.__class__], shape.orientation, shape.x, shape.y)):
+                differences.append('shape')
+            for name, batch_value, value in (('rows cleared', cleared[game], lines),
+                                             ('score', batch.score[game], engine.score),
+                                             ('level', batch.level[game], engine.level),
+                                             ('delay', batch.delay[game], engine.delay),
+                                             ('over', over[game], engine.over)):
+                if batch_value != value:
+                    differences.append(name)
+            if differences:
+                failed[game] = 'game %d, step %d: %s differ' % (game, step,
+                                                              ', '.join(differences))
+
+        restart = [game for game in numpy.nonzero(over)[0] if game not in failed]
+        for game in restart:
+            game_seed = next(seeds)
+            pieces[game] = tetris_engine.PieceGenerator(game_seed)
+            engines[game].reset(game_seed)
+            plans[game] = []
+        if restart:
+            batch.reset(restart)
+    return [failed[game] for game in sorted(failed)]
+
+
+def main():
+    failed = check()
+    for failure in failed:
+        print(failure)
+    print('%d of %d games went differently on the two engines' % (len(failed), CHECK_GAMES))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
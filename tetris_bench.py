@@ -0,0 +1,320 @@
+''' Measures how fast the hot paths of the engine are, e.g.
+
+        python tetris_bench.py --output bench.json
+        python tetris_bench.py --baseline bench_baseline.json
+
+    The first command writes the results to bench.json. The second
+    compares them with a stored run and exits with status 1 if any
+    benchmark got slower by more than the tolerance. Use
+    --save-baseline to store the results of this run as the baseline.
+
+    Every benchmark works on the same boards, shapes and seeds each
+    time. Each one is run --repeat times with the garbage collector off
+    and the fastest run counts, which is the run least disturbed by
+    the rest of the machine.
+'''
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+
+import tetris_engine
+import tetris_selfplay
+from tetris_timing import clock
+
+
+############################################################
+# BOARDS AND SHAPES
+############################################################
+
+class Square(tetris_engine.Shape):
+    ''' Square class: a shape of a single block, used to fill the
+        squares of the benchmark boards one by one
+    '''
+    __slots__ = ()
+    OFFSETS = [(0, 0)]
+    COLOR = tetris_engine.I_shape.COLOR
+    ID = tetris_engine.I_shape.ID
+    ROTATES = False
+
+Square.ORIENTATIONS = tetris_engine.build_orientations(Square)
+
+
+# the bottom rows of a board in the middle of a game, '#' for a block
+MID_GAME = ['....#.....',
+            '#..##...#.',
+            '##.###.##.',
+            '#####.###.',
+            '.#########',
+            '####.#####']
+
+FULL_ROW = '#' * tetris_engine.TetrisEngine.BOARD_WIDTH
+
+
+def make_board(rows, width=tetris_engine.TetrisEngine.BOARD_WIDTH,
+               height=tetris_engine.TetrisEngine.BOARD_HEIGHT):
+    ''' Parameters: rows - type: list - of strings, the bottom rows of
+                           the board from the top down, '#' for a block
+                    width, height - type: int
+        Return value: type: tetris_engine.Board
+    '''
+    board = tetris_engine.Board(width, height)
+    top = height - len(rows)
+    for y, row in enumerate(rows):
+        for x, square in enumerate(row):
+            if square == '#':
+                board.add_shape(Square(tetris_engine.Cell(x, top + y)))
+    return board
+
+
+def sample_shapes(board):
+    ''' Parameter: board - type: tetris_engine.Board
+        Return value: type: list - of Shape
+
+        a shape of every class in every orientation, at every
+        column it fits in, at the top of board
+    '''
+    shapes = []
+    for shape_class in tetris_engine.SHAPES:
+        for orientation in range(len(shape_class.ORIENTATIONS)):
+            for x in range(board.width):
+                shape = shape_class(tetris_engine.Cell(x, 2))
+                shape.orientation = orientation
+                if shape.can_move(board, 0, 0):
+                    shapes.append(shape)
+    return shapes
+
+
+############################################################
+# BENCHMARKS
+############################################################
+
+# Each benchmark takes the number of operations to make and returns
+# (seconds, operations made). Setting up is not timed
+
+def bench_board_can_move(number):
+    board = make_board(MID_GAME)
+    squares = [(x, y) for y in range(-1, board.height + 1)
+               for x in range(-1, board.width + 1)]
+    loops = max(1, number // len(squares))
+    can_move = board.can_move
+    start = clock()
+    for i in xrange(loops):
+        for x, y in squares:
+            can_move(x, y)
+    return clock() - start, loops * len(squares)
+
+
+def bench_shape_can_move(number):
+    board = make_board(MID_GAME)
+    shapes = sample_shapes(board)
+    loops = max(1, number // (3 * len(shapes)))
+    start = clock()
+    for i in xrange(loops):
+        for shape in shapes:
+            shape.can_move(board, -1, 0)
+            shape.can_move(board, 1, 0)
+            shape.can_move(board, 0, 1)
+    return clock() - start, loops * 3 * len(shapes)
+
+
+def bench_can_rotate(number):
+    board = make_board(MID_GAME)
+    shapes = sample_shapes(board)
+    loops = max(1, number // len(shapes))
+    start = clock()
+    for i in xrange(loops):
+        for shape in shapes:
+            shape.can_rotate(board)
+    return clock() - start, loops * len(shapes)
+
+
+def bench_rotate(number):
+    board = make_board(MID_GAME)
+    shapes = sample_shapes(board)
+    loops = max(1, number // len(shapes))
+    start = clock()
+    for i in xrange(loops):
+        for shape in shapes:
+            shape.rotate(board)
+    return clock() - start, loops * len(shapes)
+
+
+def bench_hard_drop(number):
+    board = make_board(MID_GAME)
+    shapes = sample_shapes(board)
+    loops = max(1, number // len(shapes))
+    start = clock()
+    for i in xrange(loops):
+        for shape in shapes:
+            distance = shape.drop_distance(board)
+            shape.move(0, distance)
+            shape.move(0, -distance)
+    return clock() - start, loops * len(shapes)
+
+
+def bench_line_clear(lines):
+    ''' Parameter: lines - type: int - how many rows each clear removes
+        Return value: type: function - the benchmark of clearing that
+                      many rows under the MID_GAME rows
+    '''
+    def bench(number):
+        template = make_board(MID_GAME + [FULL_ROW] * lines)
+        boards = [template.copy() for i in xrange(number)]
+        start = clock()
+        for board in boards:
+            board.remove_complete_rows()
+        return clock() - start, number
+    return bench
+
+
+def bench_create_new_shape(number):
+    engine = tetris_engine.TetrisEngine(seed=0)
+    create_new_shape = engine.create_new_shape
+    start = clock()
+    for i in xrange(number):
+        create_new_shape()
+    return clock() - start, number
+
+
+def bench_games(number):
+    # random games, as tetris_selfplay plays them, to the end
+    start = clock()
+    for seed in xrange(number):
+        tetris_selfplay.play_game((seed, 'random', sys.maxint, None, False))
+    return clock() - start, number
+
+
+# (name, benchmark, number of operations per run)
+BENCHMARKS = [('board.can_move', bench_board_can_move, 200000),
+              ('shape.can_move', bench_shape_can_move, 200000),
+              ('shape.can_rotate', bench_can_rotate, 200000),
+              ('shape.rotate', bench_rotate, 200000),
+              ('hard_drop', bench_hard_drop, 100000),
+              ('remove_complete_rows.1', bench_line_clear(1), 20000),
+              ('remove_complete_rows.2', bench_line_clear(2), 20000),
+              ('remove_complete_rows.3', bench_line_clear(3), 20000),
+              ('remove_complete_rows.4', bench_line_clear(4), 20000),
+              ('create_new_shape', bench_create_new_shape, 100000),
+              ('games', bench_games, 20)]
+
+
+def run(names, repeat, scale):
+    ''' Parameters: names - type: list - the benchmarks to run, or None for all
+                    repeat - type: int - runs of each benchmark
+                    scale - type: float - multiplies the number of operations
+        Return value: type: dictionary - benchmark name to its result:
+                      operations per second of the fastest run, the number
+                      of operations and the seconds it took
+    '''
+    results = {}
+    for name, bench, number in BENCHMARKS:
+        if names and name not in names:
+            continue
+        number = max(1, int(number * scale))
+        best = None
+        for i in range(repeat):
+            # as timeit does, so a collection does not land in one run only
+            gc.collect()
+            gc.disable()
+            try:
+                seconds, done = bench(number)
+            finally:
+                gc.enable()
+            if best is None or seconds < best[0]:
+                best = (seconds, done)
+        seconds, done = best
+        results[name] = {'per_second': done / seconds if seconds else float('inf'),
+                         'number': done,
+                         'seconds': seconds}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    ''' Parameters: results, baseline - type: dictionary - from run
+                    tolerance - type: float - how much slower than the
+                                baseline a benchmark may be, e.g. 0.1 for 10%
+        Return value: type: list - the names of the benchmarks that got
+                      slower than that
+
+        prints each benchmark next to its baseline
+    '''
+    slower = []
+    for name, bench, number in BENCHMARKS:
+        if name not in results:
+            continue
+        per_second = results[name]['per_second']
+        if name not in baseline:
+            print('%-24s %14.1f/s' % (name, per_second))
+            continue
+        before = baseline[name]['per_second']
+        change = per_second / before - 1
+        status = ''
+        if change < -tolerance:
+            status = 'SLOWER'
+            slower.append(name)
+        print('%-24s %14.1f/s %14.1f/s %+7.1f%% %s' % (name, per_second, before,
+                                                      change * 100, status))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the WTP Tetris engine.')
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help='benchmarks to run (default: all of them)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each benchmark; the fastest counts')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the operations of every benchmark, '
+                             'e.g. 0.1 for a quick run')
+    parser.add_argument('--output', default='bench.json',
+                        help='where to write the results')
+    parser.add_argument('--baseline', default=None,
+                        help='results of an earlier run to compare with')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write the results to the --baseline file too')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='how much slower than the baseline a benchmark may '
+                             'be before it counts as a regression (default: 0.15)')
+    args = parser.parse_args()
+    if args.save_baseline and args.baseline is None:
+        parser.error('--save-baseline needs --baseline FILE')
+
+    known = [name for name, bench, number in BENCHMARKS]
+    for name in args.names:
+        if name not in known:
+            parser.error('unknown benchmark %s, choose from %s' % (name, ', '.join(known)))
+
+    results = run(args.names, args.repeat, args.scale)
+    report = {'python': platform.python_version(),
+              'implementation': platform.python_implementation(),
+              'machine': platform.machine(),
+              'repeat': args.repeat,
+              'scale': args.scale,
+              'benchmarks': results}
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+
+    baseline = {}
+    if args.baseline is not None and not args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)['benchmarks']
+        else:
+            print('no baseline at %s yet' % args.baseline)
+    slower = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+        print('baseline saved to %s' % args.baseline)
+    if slower:
+        print('%d benchmark(s) slower than the baseline: %s' % (len(slower), ', '.join(slower)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,906 @@
+import collections
+import random
+
+
+############################################################
+# CELL CLASS
+############################################################
+
+class Cell(object):
+    ''' Cell class:
+        A single square of a tetris piece. Unlike Block it has no
+        drawing state, so the game rules can run without Tk.
+        Attributes: x - type: int
+                    y - type: int
+        specify the position on the tetris board
+        in terms of the square grid
+    '''
+
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+############################################################
+# ORIENTATION CLASS
+############################################################
+
+class Orientation(object):
+    ''' Orientation class:
+        One rotation of a shape, precomputed once at import
+        Attributes: offsets - type: tuple - (dx, dy) of each block from
+                              the center block
+                    left, right, bottom - type: int - the extent of the
+                              offsets around the center block
+                    masks - type: tuple - (dy, mask) for each row the shape
+                            covers; bit i of mask is column x + left + i
+                    bottoms - type: tuple - (dx, dy) of the lowest block
+                              in each column the shape covers
+    '''
+
+    def __init__(self, offsets):
+        self.offsets = tuple(offsets)
+        self.left = min([dx for dx, dy in offsets])
+        self.right = max([dx for dx, dy in offsets])
+        self.bottom = max([dy for dx, dy in offsets])
+
+        masks = {}
+        for dx, dy in offsets:
+            masks[dy] = masks.get(dy, 0) | 1 << (dx - self.left)
+        self.masks = tuple(sorted(masks.items()))
+
+        bottoms = {}
+        for dx, dy in offsets:
+            bottoms[dx] = max(bottoms.get(dx, dy), dy)
+        self.bottoms = tuple(sorted(bottoms.items()))
+
+
+def build_orientations(shape_class):
+    ''' Parameter: shape_class - type: Shape class
+        Return value: type: list - of Orientation
+
+        rotates the spawn offsets of shape_class about its center block
+        until they come back to the start. Each rotation maps (dx, dy)
+        to (rotation_dir*dy, -rotation_dir*dx); shapes that shift rotation
+        direction flip rotation_dir after every turn, so they only have
+        two orientations
+    '''
+    if not shape_class.ROTATES:
+        return [Orientation(shape_class.OFFSETS)]
+
+    start = (tuple(shape_class.OFFSETS), shape_class.ROTATION_DIR)
+    offsets, rotation_dir = start
+    orientations = []
+    while True:
+        orientations.append(Orientation(offsets))
+        offsets = tuple([(rotation_dir*dy, -rotation_dir*dx) for dx, dy in offsets])
+        if shape_class.SHIFT_ROTATION_DIR:
+            rotation_dir *= -1
+        if (offsets, rotation_dir) == start:
+            return orientations
+
+
+############################################################
+# SHAPE CLASS
+############################################################
+
+class Shape(object):
+    ''' Shape class:
+        Base class for all the tetris shapes. A shape is its center block
+        plus an index into the ORIENTATIONS table of its class, so moving
+        and rotating never recompute the block coordinates
+        Attributes: x - type: int - the column of the center block
+                    y - type: int - the row of the center block
+                    orientation - type: int - the index of the current orientation
+                    color - type: string - the color the shape is drawn with,
+                            read from COLOR
+
+        Subclasses set OFFSETS (the blocks around the center at spawn),
+        COLOR, ROTATION_DIR, SHIFT_ROTATION_DIR and ROTATES, and an empty
+        __slots__ so their shapes stay as small as this one;
+        ORIENTATIONS and ID are set once at import
+    '''
+
+    __slots__ = ('x', 'y', 'orientation')
+
+    OFFSETS = []
+    COLOR = None
+    # 1 + the index of the class in SHAPES, the value a board stores
+    # in the squares the shape fills
+    ID = 0
+    ROTATION_DIR = 1
+    SHIFT_ROTATION_DIR = False
+    ROTATES = True
+    ORIENTATIONS = []
+
+    def __init__(self, center):
+        self.x = center.x
+        self.y = center.y
+        self.orientation = 0
+
+    @property
+    def color(self):
+        return self.COLOR
+
+    def copy(self):
+        ''' Return value: type: Shape
+
+            returns a shape of the same class at the same position
+            and orientation
+        '''
+        shape = self.__class__(Cell(self.x, self.y))
+        shape.orientation = self.orientation
+        return shape
+
+    def get_blocks(self):
+        '''returns the list of cells
+        '''
+        x = self.x
+        y = self.y
+        return [Cell(x + dx, y + dy)
+                for dx, dy in self.ORIENTATIONS[self.orientation].offsets]
+
+    def move(self, dx, dy):
+        ''' Parameters: dx - type: int
+                        dy - type: int
+
+            moves the shape dx squares in the x direction
+            and dy squares in the y direction
+        '''
+        self.x += dx
+        self.y += dy
+
+    def can_move(self, board, dx, dy):
+        ''' Parameters: board - type: Board
+                        dx - type: int
+                        dy - type: int
+            Return value: type: bool
+
+            checks if the shape can move dx squares in the x direction
+            and dy squares in the y direction
+            Returns True if all of its blocks can, and False otherwise
+        '''
+        return board.fits(self.ORIENTATIONS[self.orientation],
+                          self.x + dx, self.y + dy)
+
+    def drop_distance(self, board):
+        ''' Parameters: board - type: Board
+            Return value: type: int
+
+            the number of squares the shape can fall before it lands
+        '''
+        return board.drop_distance(self.ORIENTATIONS[self.orientation],
+                                   self.x, self.y)
+
+    def next_orientation(self):
+        ''' Return value: type: int
+
+            the index of the orientation the shape rotates into
+        '''
+        return (self.orientation + 1) % len(self.ORIENTATIONS)
+
+    def can_rotate(self, board):
+        ''' Parameters: board - type: Board
+            Return value: type : bool
+
+            Checks if the shape can be rotated, return True
+            if it can, False otherwise
+        '''
+        if not self.ROTATES:
+            return False
+        return board.fits(self.ORIENTATIONS[self.next_orientation()],
+                          self.x, self.y)
+
+    def rotate(self, board):
+        ''' Parameters: board - type: Board
+
+            rotates the shape into its next orientation
+        '''
+        self.orientation = self.next_orientation()
+
+
+############################################################
+# ALL SHAPE CLASSES
+############################################################
+
+class I_shape(Shape):
+    __slots__ = ()
+    OFFSETS = [(-1, 0), (0, 0), (1, 0), (2, 0)]
+    COLOR = 'blue'
+    ROTATION_DIR = -1
+    SHIFT_ROTATION_DIR = True
+
+class J_shape(Shape):
+    __slots__ = ()
+    OFFSETS = [(-1, 0), (0, 0), (1, 0), (1, 1)]
+    COLOR = 'orange'
+
+class L_shape(Shape):
+    __slots__ = ()
+    OFFSETS = [(-1, 0), (0, 0), (1, 0), (-1, 1)]
+    COLOR = 'cyan'
+
+class O_shape(Shape):
+    __slots__ = ()
+    OFFSETS = [(0, 0), (-1, 0), (0, 1), (-1, 1)]
+    COLOR = 'red'
+    ROTATES = False
+
+class S_shape(Shape):
+    __slots__ = ()
+    OFFSETS = [(0, 0), (0, 1), (1, 0), (-1, 1)]
+    COLOR = 'green'
+    SHIFT_ROTATION_DIR = True
+
+class T_shape(Shape):
+    __slots__ = ()
+    OFFSETS = [(-1, 0), (0, 0), (1, 0), (0, 1)]
+    COLOR = 'yellow'
+
+class Z_shape(Shape):
+    __slots__ = ()
+    OFFSETS = [(-1, 0), (0, 0), (0, 1), (1, 1)]
+    COLOR = 'magenta'
+    SHIFT_ROTATION_DIR = True
+
+
+SHAPES = [I_shape, J_shape, L_shape, O_shape, S_shape, T_shape, Z_shape]
+
+for shape_class in SHAPES:
+    shape_class.ORIENTATIONS = build_orientations(shape_class)
+    shape_class.ID = SHAPES.index(shape_class) + 1
+
+# the color of each value a board stores in its squares
+COLORS = [None] + [shape_class.COLOR for shape_class in SHAPES]
+
+
+def spawn_shape(shape_class, board):
+    ''' Parameters: shape_class - type: Shape class
+                    board - type: Board
+        Return value: type: Shape
+
+        creates a shape of shape_class centered
+        at the top center of the board
+    '''
+    return shape_class(Cell(board.width // 2 - 1, 0))
+
+
+############################################################
+# ZOBRIST KEYS CLASS
+############################################################
+
+class ZobristKeys(object):
+    ''' ZobristKeys class:
+        Random 64 bit keys for the squares of a board. The hash of a board
+        is the xor of the keys of its filled squares, so filling a square
+        changes it by one xor
+        Attributes: squares - type: list - squares[y][x] is the key of square x,y
+                    chunks - type: list - chunks[y][c][byte] is the xor of the
+                             keys of the squares of row y set in byte, for
+                             columns 8*c to 8*c + 7; row_key uses them to
+                             hash a whole row in a few lookups
+    '''
+
+    __slots__ = ('squares', 'chunks')
+
+    def __init__(self, width, height):
+        # the same size always gets the same keys
+        rng = random.Random('zobrist %d %d' % (width, height))
+        self.squares = [[rng.getrandbits(64) for x in range(width)]
+                        for y in range(height)]
+        self.chunks = []
+        for keys in self.squares:
+            tables = []
+            for start in range(0, width, 8):
+                table = [0] * 256
+                for byte in range(1, 256):
+                    low = byte & -byte
+                    x = start + low.bit_length() - 1
+                    table[byte] = table[byte ^ low] ^ (keys[x] if x < width else 0)
+                tables.append(table)
+            self.chunks.append(tables)
+
+    def row_key(self, y, mask):
+        ''' Parameters: y - type: int
+                        mask - type: int - the bitmask of a row
+            Return value: type: int
+
+            the xor of the keys of the squares set in mask, in row y
+        '''
+        key = 0
+        for table in self.chunks[y]:
+            key ^= table[mask & 255]
+            mask >>= 8
+        return key
+
+
+_zobrist_keys = {}
+
+def zobrist_keys(width, height):
+    ''' Parameters: width - type: int
+                    height - type: int
+        Return value: type: ZobristKeys
+
+        the keys for boards of the given size, made once and shared
+    '''
+    keys = _zobrist_keys.get((width, height))
+    if keys is None:
+        keys = _zobrist_keys[(width, height)] = ZobristKeys(width, height)
+    return keys
+
+
+############################################################
+# BOARD CLASS
+############################################################
+
+class Board(object):
+    ''' Board class: it represents the state of the Tetris board
+
+        Attributes: width - type:int - width of the board in squares
+                    height - type:int - height of the board in squares
+                    full_row - type:int - the bitmask of a complete row
+                    rows - type:list - one bitmask per row, from the top;
+                    bit x is set when square (x, y) is occupied
+                    colors - type:bytearray - the ID of the shape that
+                    filled each square, row by row from the top, used only
+                    for drawing; 0 where the square is empty
+                    heights - type:bytearray - for each column, the number of
+                    squares from the bottom up to its highest block
+                    row_counts - type:bytearray - the number of blocks in each row
+                    block_count - type:int - the number of blocks on the board
+                    keys - type:ZobristKeys - shared by boards of the same size
+                    zobrist - type:int - the hash of the filled squares;
+                    boards with the same squares filled have the same hash
+
+        heights, row_counts, block_count and zobrist are kept up to date by
+        add_shape and remove_complete_rows; read them through the
+        methods below rather than changing them.
+        The bytearrays keep a board small, but limit it to 255 squares
+        in each direction
+    '''
+
+    __slots__ = ('width', 'height', 'full_row', 'rows', 'colors',
+                 'heights', 'row_counts', 'block_count', 'keys', 'zobrist')
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1
+        self.keys = zobrist_keys(width, height)
+        self.clear()
+
+    def clear(self):
+        ''' removes every block from the board
+        '''
+        # currently we have no shapes on the board
+        self.rows = [0] * self.height
+        self.colors = bytearray(self.width * self.height)
+        self.heights = bytearray(self.width)
+        self.row_counts = bytearray(self.height)
+        self.block_count = 0
+        self.zobrist = 0
+
+    def copy(self):
+        ''' Return value: type: Board
+
+            returns an independent copy of the board, e.g. to try
+            out a placement
+        '''
+        board = Board.__new__(Board)
+        board.width = self.width
+        board.height = self.height
+        board.full_row = self.full_row
+        board.rows = list(self.rows)
+        board.colors = bytearray(self.colors)
+        board.heights = bytearray(self.heights)
+        board.row_counts = bytearray(self.row_counts)
+        board.block_count = self.block_count
+        board.keys = self.keys
+        board.zobrist = self.zobrist
+        return board
+
+    def snapshot(self):
+        ''' Return value: type: tuple
+
+            the contents of the board in immutable form: a tuple of the
+            row bitmasks and byte strings of the color plane, heights and
+            row counts, plus the block count and hash. Only restore should
+            look inside it
+        '''
+        return (tuple(self.rows), bytes(self.colors), bytes(self.heights),
+                bytes(self.row_counts), self.block_count, self.zobrist)
+
+    def restore(self, snapshot):
+        ''' Parameter: snapshot - type: tuple - from snapshot, of a board
+                       of the same size
+
+            puts the board back the way it was when snapshot was taken
+        '''
+        rows, colors, heights, row_counts, self.block_count, self.zobrist = snapshot
+        self.rows = list(rows)
+        self.colors = bytearray(colors)
+        self.heights = bytearray(heights)
+        self.row_counts = bytearray(row_counts)
+
+    def can_move(self, x, y):
+        ''' Parameters: x - type:int
+                        y - type:int
+            Return value: type: bool
+
+            1. check if it is ok to move to square x,y
+            if the position is outside of the board boundaries, can't move there
+            return False
+
+            2. if there is already a block at that postion, can't move there
+            return False
+
+            3. otherwise return True
+            Squares above the top of the board are always free.
+        '''
+        if x < 0 or x >= self.width or y >= self.height:
+            return False
+        if y < 0:
+            return True
+        return not (self.rows[y] >> x) & 1
+
+    def fits(self, orientation, x, y):
+        ''' Parameters: orientation - type: Orientation
+                        x - type:int
+                        y - type:int
+            Return value: type: bool
+
+            checks if a shape in the given orientation fits with its
+            center block at square x,y: one mask test per row it covers
+        '''
+        x0 = x + orientation.left
+        if (x0 < 0 or x + orientation.right >= self.width or
+            y + orientation.bottom >= self.height):
+            return False
+        rows = self.rows
+        for dy, mask in orientation.masks:
+            row = y + dy
+            if row >= 0 and rows[row] & (mask << x0):
+                return False
+        return True
+
+    def drop_distance(self, orientation, x, y):
+        ''' Parameters: orientation - type: Orientation
+                        x - type:int
+                        y - type:int
+            Return value: type: int
+
+            the number of squares a shape in the given orientation, with
+            its center block at x,y, can fall: for the lowest block in each
+            of its columns, the distance to the first filled square below
+            it, or to the bottom of the board
+        '''
+        rows = self.rows
+        height = self.height
+        heights = self.heights
+        distance = height
+        for dx, dy in orientation.bottoms:
+            column = x + dx
+            below = y + dy + 1
+            # the highest block of the column, unless the shape is
+            # already below it and has to look further down
+            row = height - heights[column]
+            if row < below:
+                bit = 1 << column
+                row = max(below, 0)
+                while row < height and not rows[row] & bit:
+                    row += 1
+            if row - below < distance:
+                distance = row - below
+        return distance
+
+    def get_color(self, x, y):
+        ''' Parameters: x - type:int
+                        y - type:int
+            Return value: type: string
+
+            returns the color of the block at square x,y or None
+            if the square is empty
+        '''
+        return COLORS[self.colors[y * self.width + x]]
+
+    def add_shape(self, shape):
+        ''' Parameter: shape - type:Shape
+
+            add a shape to the board, i.e. set the bit and the color
+            of each of its cells. Cells above the top of the board
+            are dropped
+        '''
+        rows = self.rows
+        heights = self.heights
+        squares = self.keys.squares
+        for block in shape.get_blocks():
+            if block.y >= 0:
+                rows[block.y] |= 1 << block.x
+                self.zobrist ^= squares[block.y][block.x]
+                self.colors[block.y * self.width + block.x] = shape.ID
+                self.row_counts[block.y] += 1
+                self.block_count += 1
+                if self.height - block.y > heights[block.x]:
+                    heights[block.x] = self.height - block.y
+
+    def is_row_complete(self, y):
+        ''' Parameter: y - type: int
+            Return value: type: bool
+
+            check if all the squares in row y are occupied.
+            return True if they are, False otherwise
+        '''
+        return self.row_counts[y] == self.width
+
+    def remove_complete_rows(self):
+        ''' Return value: type: list
+
+            removes all the complete rows and moves all rows above
+            them down. Returns the rows that were removed, from top
+            to bottom
+        '''
+        width = self.width
+        removed = [y for y, count in enumerate(self.row_counts) if count == width]
+        if not removed:
+            return removed
+
+        kept = [y for y, count in enumerate(self.row_counts) if count != width]
+        old_rows = self.rows
+        self.rows = [0] * len(removed) + [old_rows[y] for y in kept]
+        colors = bytearray(width * len(removed))
+        for y in kept:
+            colors += self.colors[y * width:(y + 1) * width]
+        self.colors = colors
+        self.row_counts = bytearray(len(removed)) + bytearray([self.row_counts[y] for y in kept])
+        self.block_count -= len(removed) * width
+
+        # only the rows down to the lowest removed one change
+        row_key = self.keys.row_key
+        rows = self.rows
+        for y in range(removed[-1] + 1):
+            if old_rows[y] != rows[y]:
+                self.zobrist ^= row_key(y, old_rows[y]) ^ row_key(y, rows[y])
+
+        # every column loses the removed rows; if its highest block was
+        # in one of them, look down for the new highest block
+        for x in range(width):
+            height = max(self.heights[x] - len(removed), 0)
+            bit = 1 << x
+            while height and not rows[self.height - height] & bit:
+                height -= 1
+            self.heights[x] = height
+        return removed
+
+    def get_column_heights(self):
+        ''' Return value: type: list
+
+            the height of each column, counted from the bottom
+        '''
+        return list(self.heights)
+
+    def get_row_counts(self):
+        ''' Return value: type: list
+
+            the number of blocks in each row, from the top
+        '''
+        return list(self.row_counts)
+
+    def max_height(self):
+        ''' Return value: type: int
+
+            the height of the highest column
+        '''
+        return max(self.heights)
+
+    def aggregate_height(self):
+        ''' Return value: type: int
+
+            the sum of the column heights
+        '''
+        return sum(self.heights)
+
+    def bumpiness(self):
+        ''' Return value: type: int
+
+            the sum of the height differences between neighbouring columns
+        '''
+        heights = self.heights
+        return sum([abs(heights[x] - heights[x + 1]) for x in range(self.width - 1)])
+
+    def holes(self):
+        ''' Return value: type: int
+
+            the number of empty squares that have a block above them
+            in the same column
+        '''
+        return sum(self.heights) - self.block_count
+
+
+############################################################
+# PIECE GENERATOR CLASS
+############################################################
+
+class PieceGenerator(object):
+    ''' PieceGenerator class: deals the shapes of a game
+        Attributes: shapes - type: list (list of Shape classes)
+                    rng - type: random.Random - generators with the same
+                          seed deal the same shapes
+                    bag - type: bool - deal the shapes in shuffled bags holding
+                          one of each, instead of independently at random
+                    preview - type: int - how many upcoming shapes are known
+                    queue - type: deque - indexes into shapes, dealt ahead
+                    state - type: tuple - the state of rng since the last
+                            fill, or None until snapshot needs it
+    '''
+
+    # how many shapes are dealt at once when the queue runs low
+    BULK = 16
+
+    def __init__(self, seed=None, bag=False, preview=1, shapes=SHAPES):
+        self.shapes = shapes
+        self.rng = random.Random(seed)
+        self.bag = bag
+        self.preview = preview
+        self.queue = collections.deque()
+        self.state = None
+        self.fill()
+
+    def fill(self):
+        ''' deals shapes into the queue until it holds the next shape
+            plus preview more
+        '''
+        count = len(self.shapes)
+        if len(self.queue) <= self.preview:
+            self.state = None
+        while len(self.queue) <= self.preview:
+            if self.bag:
+                bag = list(range(count))
+                self.rng.shuffle(bag)
+                self.queue.extend(bag)
+            else:
+                randrange = self.rng.randrange
+                self.queue.extend([randrange(count) for i in range(self.BULK)])
+
+    def next_shape(self):
+        ''' Return value: type: Shape class
+
+            takes the next shape off the queue
+        '''
+        index = self.queue.popleft()
+        self.fill()
+        return self.shapes[index]
+
+    def peek(self):
+        ''' Return value: type: list (list of Shape classes)
+
+            the preview shapes that come after the current one, in order
+        '''
+        shapes = self.shapes
+        queue = self.queue
+        return [shapes[queue[i]] for i in range(self.preview)]
+
+    def snapshot(self):
+        ''' Return value: type: tuple
+
+            the state of the random generator and the shapes dealt ahead.
+            rng is only used by fill, so its state is kept between fills
+        '''
+        if self.state is None:
+            self.state = self.rng.getstate()
+        return self.state, tuple(self.queue)
+
+    def restore(self, snapshot):
+        ''' Parameter: snapshot - type: tuple - from snapshot
+
+            deals the same shapes again as after snapshot was taken
+        '''
+        state, queue = snapshot
+        # rng is already there if nothing was dealt since the snapshot
+        if state is not self.state:
+            self.rng.setstate(state)
+            self.state = state
+        self.queue = collections.deque(queue)
+
+
+############################################################
+# TETRIS ENGINE CLASS
+############################################################
+
+def level_for_score(score):
+    ''' Parameter: score - type: int
+        Return value: type: tuple - (level, delay in milliseconds)
+
+        the level reached with the given score and the gravity delay
+        that goes with it
+    '''
+    for level, (max_score, delay) in enumerate(TetrisEngine.LEVELS):
+        if score < max_score:
+            return level + 1, delay
+    return len(TetrisEngine.LEVELS), TetrisEngine.LEVELS[-1][1]
+
+
+class TetrisEngine(object):
+    ''' TetrisEngine class: the rules of the game, without any drawing
+        Attributes:
+            SHAPES - type: list (list of Shape classes)
+            DIRECTION - type: dictionary - converts string direction to (dx, dy)
+            LEVELS - type: list - (score limit, delay in ms) for each level
+            board - type:Board - the state of the tetris board
+            current_shape - type: Shape - the current moving shape on the board
+            score - type:int - the number of rows cleared so far
+            level - type:int - the current level
+            delay - type:int - the speed in milliseconds for moving the shapes
+            over - type:bool - whether the game has ended
+            locked_shape - type: Shape - the shape that was added to the
+                           board by the last step, or None
+            cleared_rows - type: list - the rows removed by the last step
+            pieces - type: PieceGenerator - deals the new shapes
+            timings - type: tetris_timing.Timings - records how long
+                      remove_complete_rows takes, or None
+    '''
+
+    SHAPES = SHAPES
+    DIRECTION = {'Left':(-1, 0), 'Right':(1, 0), 'Down':(0, 1),}
+    BOARD_WIDTH = 10
+    BOARD_HEIGHT = 20
+    LEVELS = [(10, 1000), (20, 800), (30, 600), (40, 400), (50, 200), (60, 100)]
+
+    def __init__(self, width=BOARD_WIDTH, height=BOARD_HEIGHT, seed=None,
+                 bag=False, preview=1):
+        # games with the same seed get the same shapes
+        self.pieces = PieceGenerator(seed, bag, preview, self.SHAPES)
+        self.board = Board(width, height)
+        self.timings = None
+        self.reset()
+
+    def reset(self, seed=None):
+        ''' Parameter: seed - type: int - seeds the shapes of the new game,
+                       or None to carry on with the same piece generator
+
+            starts a new game on the same engine: empties the board,
+            sets the score back to 0 and deals a new shape
+        '''
+        if seed is not None:
+            pieces = self.pieces
+            self.pieces = PieceGenerator(seed, pieces.bag, pieces.preview, pieces.shapes)
+        self.board.clear()
+        self.score = 0
+        self.level, self.delay = level_for_score(self.score)
+        self.over = False
+        self.locked_shape = None
+        self.cleared_rows = []
+
+        # set the current shape to a random new shape
+        self.current_shape = self.create_new_shape()
+
+    def create_new_shape(self):
+        ''' Return value: type: Shape
+
+            create a random new shape that is centered
+            at the top center of the board
+            return the shape
+        '''
+        return spawn_shape(self.pieces.next_shape(), self.board)
+
+    def next_shapes(self):
+        ''' Return value: type: list (list of Shape classes)
+
+            the shapes that will follow the current shape
+        '''
+        return self.pieces.peek()
+
+    def step(self, action):
+        ''' Parameters: action - type: string - a key name: 'Left', 'Right',
+                        'Down', 'Up' (rotate) or 'space' (hard drop)
+            Return value: type: tuple - (rows cleared, game over)
+
+            applies one action to the game. Unknown actions are ignored,
+            and once the game is over every action is a no-op
+        '''
+        self.locked_shape = None
+        self.cleared_rows = []
+        if self.over:
+            return 0, True
+
+        if action == 'Up':
+            self.do_rotate()
+        elif action == 'space' or action in self.DIRECTION:
+            self.do_move(action)
+        return len(self.cleared_rows), self.over
+
+    def do_move(self, direction):
+        ''' Parameters: direction - type: string
+            Return value: type: bool
+
+            Move the current shape in the direction specified by the parameter:
+            First check if the shape can move. If it can, move it and return True
+            Otherwise if the direction we tried to move was 'Down',
+            1. add the current shape to the board
+            2. create a new random shape and set current_shape attribute
+            3. if the shape does not fit on the board, the game is over
+            4. remove the completed rows if any
+
+            return False
+        '''
+        if direction == 'space':
+            self.current_shape.move(0, self.current_shape.drop_distance(self.board))
+            return self.lock_shape()
+
+        dx, dy = self.DIRECTION[direction]
+
+        if self.current_shape.can_move(self.board, dx, dy):
+            self.current_shape.move(dx, dy)
+            return True
+
+        elif direction == 'Down':
+            return self.lock_shape()
+
+        return False
+
+    def lock_shape(self):
+        ''' Return value: type: Shape
+
+            adds the current shape to the board, spawns the next one and
+            removes the completed rows. Returns the new shape, or False
+            if it does not fit and the game is over
+        '''
+        self.board.add_shape(self.current_shape)
+        self.locked_shape = self.current_shape
+        self.current_shape = self.create_new_shape()
+        if not self.current_shape.can_move(self.board, 0, 0):
+            self.over = True
+            return False
+        timings = self.timings
+        if timings is None:
+            self.cleared_rows = self.board.remove_complete_rows()
+        else:
+            start = timings.clock()
+            self.cleared_rows = self.board.remove_complete_rows()
+            timings.add('remove_complete_rows', timings.clock() - start)
+        if self.cleared_rows:
+            self.score += len(self.cleared_rows)
+            self.level, self.delay = level_for_score(self.score)
+        return self.current_shape
+
+    def do_rotate(self):
+        ''' Checks if the current_shape can be rotated and
+            rotates if it can
+        '''
+        if self.current_shape.can_rotate(self.board):
+            self.current_shape.rotate(self.board)
+
+    def snapshot(self):
+        ''' Return value: type: tuple
+
+            the whole state of the game: the board, the class, position
+            and orientation of the current shape, score, level, delay,
+            whether the game is over and the state of the piece generator.
+            Nothing in it is shared with the game, so it stays valid
+            whatever happens next, and taking one costs about as much as
+            copying the rows of the board
+        '''
+        shape = self.current_shape
+        return (self.board.snapshot(),
+                (shape.__class__, shape.x, shape.y, shape.orientation),
+                self.score, self.level, self.delay, self.over,
+                self.pieces.snapshot())
+
+    def restore(self, snapshot):
+        ''' Parameter: snapshot - type: tuple - from snapshot, of a game
+                       with the same board size
+
+            puts the game back the way it was when snapshot was taken.
+            A snapshot can be restored any number of times, e.g. for undo
+            or to try out several moves from the same position
+        '''
+        (board, shape, self.score, self.level, self.delay,
+         self.over, pieces) = snapshot
+        self.board.restore(board)
+        shape_class, x, y, orientation = shape
+        self.current_shape = shape_class(Cell(x, y))
+        self.current_shape.orientation = orientation
+        self.pieces.restore(pieces)
+        self.locked_shape = None
+        self.cleared_rows = []
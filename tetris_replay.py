@@ -0,0 +1,212 @@
+''' Records games of WTP Tetris and plays them back, e.g.
+
+        python tetris_replay.py games/*.wtpr
+
+    re-simulates every replay headless and checks it still ends with
+    the score it was saved with.
+
+    A game is fully decided by the seed of its shapes and the actions
+    applied to the engine, so a replay only stores those. The file
+    format is compact binary:
+
+        'WTPR'              magic
+        varint              format version (1)
+        varint              seed
+        varint x 4          board width, board height, 7-bag (0 or 1),
+                            preview shapes
+        varint              final score
+        varint ...          one per action: (ms since the previous
+                            action << 3) | action code
+
+    Varints are unsigned LEB128: 7 bits per byte, low bits first,
+    the high bit set on every byte but the last. Most actions take
+    one or two bytes.
+'''
+
+import sys
+
+import tetris_engine
+
+
+# action codes, in the order tetris_batch uses
+ACTIONS = ['Left', 'Right', 'Down', 'Up', 'space']
+CODES = dict([(action, code) for code, action in enumerate(ACTIONS)])
+CODE_BITS = 3
+
+MAGIC = b'WTPR'
+VERSION = 1
+
+
+def encode_varint(value, out):
+    ''' Parameters: value - type: int - not negative
+                    out - type: bytearray
+
+        appends value to out as a varint
+    '''
+    while value > 0x7f:
+        out.append(0x80 | value & 0x7f)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos):
+    ''' Parameters: data - type: bytearray
+                    pos - type: int - where the varint starts
+        Return value: type: tuple - (value, position after the varint)
+    '''
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+############################################################
+# REPLAY CLASS
+############################################################
+
+class Replay(object):
+    ''' Replay class: the seed and settings of a game and the actions
+        applied to its engine, with the time of each
+        Attributes: seed - type: int - not negative
+                    width, height - type: int - the size of the board
+                    bag - type: bool - whether the shapes came in 7-bags
+                    preview - type: int - how many shapes were dealt ahead
+                    score - type: int - the score at the end, set by finish
+                    ticks - type: list - for each action, the ms since the
+                            start of the game
+                    codes - type: list - the action codes, see ACTIONS
+    '''
+
+    def __init__(self, seed, width=tetris_engine.TetrisEngine.BOARD_WIDTH,
+                 height=tetris_engine.TetrisEngine.BOARD_HEIGHT, bag=False, preview=1):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.bag = bag
+        self.preview = preview
+        self.score = 0
+        self.ticks = []
+        self.codes = []
+
+    def new_engine(self):
+        ''' Return value: type: tetris_engine.TetrisEngine
+
+            a new engine in the state the game started in
+        '''
+        return tetris_engine.TetrisEngine(self.width, self.height, self.seed,
+                                          self.bag, self.preview)
+
+    def record(self, tick, action):
+        ''' Parameters: tick - type: int - ms since the start of the game
+                        action - type: string - the action given to the engine
+
+            adds an action. Actions the engine ignores are not recorded
+        '''
+        code = CODES.get(action)
+        if code is not None:
+            if self.ticks and tick < self.ticks[-1]:
+                tick = self.ticks[-1]
+            self.ticks.append(tick)
+            self.codes.append(code)
+
+    def finish(self, engine):
+        ''' Parameter: engine - type: tetris_engine.TetrisEngine
+
+            remembers the score the game ended with, so play can check it
+        '''
+        self.score = engine.score
+
+    def to_bytes(self):
+        ''' Return value: type: bytes - the replay in the file format
+        '''
+        out = bytearray(MAGIC)
+        for value in (VERSION, self.seed, self.width, self.height,
+                      int(self.bag), self.preview, self.score):
+            encode_varint(value, out)
+        last = 0
+        for tick, code in zip(self.ticks, self.codes):
+            encode_varint((tick - last) << CODE_BITS | code, out)
+            last = tick
+        return bytes(out)
+
+    def save(self, filename):
+        ''' Parameter: filename - type: string
+        '''
+        with open(filename, 'wb') as output:
+            output.write(self.to_bytes())
+
+
+def from_bytes(data):
+    ''' Parameter: data - type: bytes - a replay in the file format
+        Return value: type: Replay
+    '''
+    data = bytearray(data)
+    if data[:len(MAGIC)] != bytearray(MAGIC):
+        raise ValueError('not a WTP Tetris replay')
+    pos = len(MAGIC)
+    values = []
+    for i in range(7):
+        value, pos = decode_varint(data, pos)
+        values.append(value)
+    version, seed, width, height, bag, preview, score = values
+    if version != VERSION:
+        raise ValueError('unsupported replay version %d' % version)
+
+    replay = Replay(seed, width, height, bool(bag), preview)
+    replay.score = score
+    ticks = replay.ticks
+    codes = replay.codes
+    mask = (1 << CODE_BITS) - 1
+    tick = 0
+    end = len(data)
+    while pos < end:
+        value, pos = decode_varint(data, pos)
+        tick += value >> CODE_BITS
+        ticks.append(tick)
+        codes.append(value & mask)
+    return replay
+
+
+def load(filename):
+    ''' Parameter: filename - type: string
+        Return value: type: Replay
+    '''
+    with open(filename, 'rb') as replay_file:
+        return from_bytes(replay_file.read())
+
+
+def play(replay):
+    ''' Parameter: replay - type: Replay
+        Return value: type: tetris_engine.TetrisEngine - in the state
+                      the game ended in
+
+        plays the whole replay headless, as fast as the engine goes
+    '''
+    engine = replay.new_engine()
+    step = engine.step
+    for code in replay.codes:
+        step(ACTIONS[code])
+    return engine
+
+
+def main():
+    failed = 0
+    for filename in sys.argv[1:]:
+        replay = load(filename)
+        engine = play(replay)
+        status = 'ok'
+        if engine.score != replay.score:
+            status = 'MISMATCH (saved with score %d)' % replay.score
+            failed += 1
+        print('%s: %d actions, score %d, %s' % (filename, len(replay.codes),
+                                                engine.score, status))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+''' Runs many headless games of WTP Tetris in parallel and writes a
+    summary of the results, e.g.
+
+        python tetris_selfplay.py --games 1000 --player ai --output summary.json
+
+    Game i is played with seed SEED + i, so the same command always
+    plays the same games.
+'''
+
+import argparse
+import json
+import multiprocessing
+import random
+import time
+
+import tetris_ai
+import tetris_engine
+
+
+PLAYERS = ['ai', 'random']
+RANDOM_ACTIONS = ['Left', 'Right', 'Down', 'Up', 'space']
+
+
+def play_game(task):
+    ''' Parameter: task - type: tuple - (seed, player name, max pieces,
+                   AI time budget, 7-bag)
+        Return value: type: dictionary - the results of the game
+
+        plays one game until it is over or max pieces have been placed
+    '''
+    seed, player_name, max_pieces, time_budget, bag = task
+    engine = tetris_engine.TetrisEngine(seed=seed, bag=bag)
+    if player_name == 'ai':
+        player = tetris_ai.AIPlayer(time_budget=time_budget)
+    else:
+        player = random.Random('player-%d' % seed)
+
+    pieces = 0
+    steps = 0
+    start = time.time()
+    while not engine.over and pieces < max_pieces:
+        if player_name == 'ai':
+            actions = player.choose(engine.board, engine.current_shape,
+                                    engine.next_shapes())
+        else:
+            actions = [player.choice(RANDOM_ACTIONS)]
+        for action in actions:
+            engine.step(action)
+            steps += 1
+            if engine.locked_shape is not None:
+                pieces += 1
+                break
+
+    return {'seed': seed,
+            'score': engine.score,
+            'level': engine.level,
+            'pieces': pieces,
+            'steps': steps,
+            'over': engine.over,
+            'seconds': time.time() - start}
+
+
+def summarize(results):
+    ''' Parameter: results - type: list - of game results from play_game
+        Return value: type: dictionary
+
+        the number of games and the total, mean, min and max
+        of each measure, plus the results of every game
+    '''
+    summary = {'games': len(results),
+               'finished': len([result for result in results if result['over']])}
+    for name in ['score', 'pieces', 'steps', 'seconds']:
+        values = [result[name] for result in results]
+        summary[name] = {'total': sum(values),
+                         'mean': float(sum(values)) / len(values),
+                         'min': min(values),
+                         'max': max(values)}
+    summary['results'] = sorted(results, key=lambda result: result['seed'])
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run headless WTP Tetris games in parallel.')
+    parser.add_argument('--games', type=int, default=100,
+                        help='number of games to play')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first game')
+    parser.add_argument('--player', choices=PLAYERS, default='ai',
+                        help='who plays the games')
+    parser.add_argument('--max-pieces', type=int, default=1000,
+                        help='stop a game after this many pieces')
+    parser.add_argument('--bag', action='store_true',
+                        help='deal the shapes in 7-bags')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='seconds the AI may spend on each piece (default: no '
+                             'limit, so the results only depend on the seed)')
+    parser.add_argument('--output', default='selfplay_summary.json',
+                        help='where to write the summary')
+    args = parser.parse_args()
+    if args.games < 1:
+        parser.error('--games must be at least 1')
+
+    tasks = [(args.seed + i, args.player, args.max_pieces, args.time_budget, args.bag)
+             for i in range(args.games)]
+    start = time.time()
+    pool = multiprocessing.Pool(args.processes)
+    try:
+        results = list(pool.imap_unordered(play_game, tasks))
+    finally:
+        pool.close()
+        pool.join()
+
+    summary = summarize(results)
+    summary['wall_seconds'] = time.time() - start
+    summary['player'] = args.player
+    summary['bag'] = args.bag
+    summary['processes'] = args.processes
+    with open(args.output, 'w') as output:
+        json.dump(summary, output, indent=2, sort_keys=True)
+
+    print('%d games, mean score %.1f, mean pieces %.1f, %.1fs -> %s' %
+          (summary['games'], summary['score']['mean'], summary['pieces']['mean'],
+           summary['wall_seconds'], args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+''' Measures how long the parts of the game loop take, e.g.
+
+        python wtp_tetris_template_extra.py --timings timings.json --overlay
+
+    plays with the timings recorded, shown on the scoreboard and written
+    to timings.json when the window is closed.
+
+    Each section (e.g. 'render') keeps its last samples in a ring
+    buffer, so recording costs the same however long the game runs and
+    the summary describes the recent play rather than the whole session.
+'''
+
+import json
+import time
+
+
+# seconds from an arbitrary start, as precise as Python has it
+clock = getattr(time, 'perf_counter', time.time)
+
+PERCENTILES = (50, 95, 99)
+
+
+############################################################
+# SAMPLES CLASS
+############################################################
+
+class Samples(object):
+    ''' Samples class: the last size durations of one section,
+        in a ring buffer
+        Attributes: values - type: list - the durations, in seconds
+                    pos - type: int - where the next duration goes
+                    count - type: int - how many durations were added
+                            in all, including the overwritten ones
+    '''
+
+    def __init__(self, size):
+        self.values = [0.0] * size
+        self.pos = 0
+        self.count = 0
+
+    def add(self, seconds):
+        ''' Parameter: seconds - type: float
+        '''
+        values = self.values
+        values[self.pos] = seconds
+        self.pos = (self.pos + 1) % len(values)
+        self.count += 1
+
+    def recent(self):
+        ''' Return value: type: list - the durations still in the buffer
+        '''
+        return self.values[:min(self.count, len(self.values))]
+
+    def summary(self):
+        ''' Return value: type: dictionary - the number of samples and the
+                          mean, max and each of PERCENTILES in milliseconds
+                          over the recent ones
+        '''
+        values = sorted(self.recent())
+        result = {'count': self.count}
+        if not values:
+            return result
+        result['mean'] = sum(values) * 1000 / len(values)
+        result['max'] = values[-1] * 1000
+        for percentile in PERCENTILES:
+            # nearest rank
+            rank = max(0, (len(values) * percentile + 99) // 100 - 1)
+            result['p%d' % percentile] = values[rank] * 1000
+        return result
+
+
+############################################################
+# TIMINGS CLASS
+############################################################
+
+class Timings(object):
+    ''' Timings class: the durations of every section of the game loop.
+        Time a section with
+            start = timings.clock()
+            ...
+            timings.add('render', timings.clock() - start)
+        Attributes: size - type: int - how many durations each section keeps
+                    sections - type: dictionary - section name to Samples
+                    clock - type: function - returns the time in seconds
+    '''
+
+    SIZE = 1000
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self.sections = {}
+        self.clock = clock
+
+    def add(self, name, seconds):
+        ''' Parameters: name - type: string - the section
+                        seconds - type: float - how long it took once
+        '''
+        samples = self.sections.get(name)
+        if samples is None:
+            samples = self.sections[name] = Samples(self.size)
+        samples.add(seconds)
+
+    def summary(self):
+        ''' Return value: type: dictionary - section name to its
+                          Samples.summary
+        '''
+        return dict([(name, samples.summary())
+                     for name, samples in self.sections.items()])
+
+    def dump(self, filename):
+        ''' Parameter: filename - type: string
+
+            writes the summary to filename as JSON
+        '''
+        with open(filename, 'w') as output:
+            json.dump(self.summary(), output, indent=2, sort_keys=True)
+
+    def overlay_text(self, names):
+        ''' Parameter: names - type: list - of section names
+            Return value: type: string - one line with the p95 and p99 of
+                          each of the sections, in milliseconds
+        '''
+        parts = []
+        for name in names:
+            summary = self.sections[name].summary() if name in self.sections else {}
+            if 'p95' in summary:
+                parts.append('%s %.1f/%.1f' % (name, summary['p95'], summary['p99']))
+        return '  '.join(parts)
@@ -1,5 +1,12 @@
 from graphics import *
+import os
 import random
+import sys
+import time
+import tetris_ai
+import tetris_engine
+import tetris_replay
+import tetris_timing
 
 
 ############################################################
@@ -17,11 +24,12 @@ class Block(Rectangle):
 
     BLOCK_SIZE = 30
     OUTLINE_WIDTH = 3
+    OUTLINE = 'seashell4'
 
     def __init__(self, pos, color):
         self.x = pos.x
         self.y = pos.y
-        
+
         p1 = Point(pos.x*Block.BLOCK_SIZE + Block.OUTLINE_WIDTH,
                    pos.y*Block.BLOCK_SIZE + Block.OUTLINE_WIDTH)
         p2 = Point(p1.x + Block.BLOCK_SIZE, p1.y + Block.BLOCK_SIZE)
@@ -29,31 +37,12 @@ class Block(Rectangle):
         Rectangle.__init__(self, p1, p2)
         self.setWidth(Block.OUTLINE_WIDTH)
         self.setFill(color)
-        self.setOutline('seashell4')
-
-        
-
-    def can_move(self, board, dx, dy):
-        ''' Parameters: dx - type: int
-                        dy - type: int
+        self.setOutline(Block.OUTLINE)
 
-            Return value: type: bool
-                        
-            checks if the block can move dx squares in the x direction
-            and dy squares in the y direction
-            Returns True if it can, and False otherwise
-        '''
-##        if board.can_move(self.x + dx, self.y + dy) == True:
-##            return True
-##
-##        elif board.can_move(self.x + dx, self.y + dy) == False:
-##            return False
-        return board.can_move(self.x + dx, self.y + dy)
-    
     def move(self, dx, dy):
         ''' Parameters: dx - type: int
                         dy - type: int
-                        
+
             moves the block dx squares in the x direction
             and dy squares in the y direction
         '''
@@ -62,26 +51,30 @@ class Block(Rectangle):
 
         Rectangle.move(self, dx*Block.BLOCK_SIZE, dy*Block.BLOCK_SIZE)
 
+    def set_look(self, fill, outline):
+        ''' Parameters: fill - type: string
+                        outline - type: string
+
+            recolors the block with one Tk call that only sends the
+            colors that changed. A block with '' for both is invisible
+        '''
+        self.setConfig(fill=fill, outline=outline)
+
 ############################################################
-# SHAPE CLASS
+# SHAPE VIEW CLASS
 ############################################################
 
-class Shape(object):
-    ''' Shape class:
-        Base class for all the tetris shapes
+class ShapeView(object):
+    ''' ShapeView class:
+        Draws a tetris shape of the engine
         Attributes: blocks - type: list - the list of blocks making up the shape
-                    rotation_dir - type: int - the current rotation direction of the shape
-                    shift_rotation_dir - type: bool - whether or not the shape shifts rotation direction
     '''
 
-    def __init__(self, coords, color):
+    def __init__(self, shape):
         self.blocks = []
-        self.rotation_dir = 1
-        # A boolean to indicate if a shape shifts rotation direction or not
-        self.shift_rotation_dir = False
 
-        for pos in coords:
-            self.blocks.append(Block(pos, color))
+        for cell in shape.get_blocks():
+            self.blocks.append(Block(cell, shape.color))
 
     def get_blocks(self):
         '''returns the list of blocks
@@ -93,161 +86,61 @@ class Shape(object):
 
             Draws the shape:
             i.e. draws each block
-        ''' 
+        '''
         for block in self.blocks:
             block.draw(win)
 
-    def move(self, dx, dy):
-        ''' Parameters: dx - type: int
-                        dy - type: int
-
-            moves the shape dx squares in the x direction
-            and dy squares in the y direction, i.e.
-            moves each of the blocks
+    def undraw(self):
+        ''' Erases the shape:
+            i.e. undraws each block
         '''
         for block in self.blocks:
-            block.move(dx, dy)
+            block.undraw()
 
-    def can_move(self, board, dx, dy):
-        ''' Parameters: dx - type: int
-                        dy - type: int
+    def show(self, shape):
+        ''' Parameter: shape - type: tetris_engine.Shape
 
-            Return value: type: bool
-                        
-            checks if the shape can move dx squares in the x direction
-            and dy squares in the y direction
-            Returns True if all of them can, and False otherwise
+            moves the blocks onto the cells of shape and gives them
+            its color, so the same blocks can show shape after shape
         '''
-        for block in self.blocks:
-            if block.can_move(board, dx, dy) == False:
-                return False
-        return True
-                
-    
-    def can_rotate(self, board):
-        ''' Parameters: board - type: Board object
-            Return value: type : bool
-            
-            Checks if the shape can be rotated, return True
-            if it can, False otherwise
-        '''
-        
-        for block in self.blocks:
-            x = self.center_block.x - self.rotation_dir*self.center_block.y + self.rotation_dir*block.y
-            y = self.center_block.y + self.rotation_dir*self.center_block.x - self.rotation_dir*block.x
-            if board.can_move(x, y) == False:
-                return False
-        return True
-
-    def rotate(self, board):
-        ''' Parameters: board - type: Board object
+        for block, cell in zip(self.blocks, shape.get_blocks()):
+            if block.x != cell.x or block.y != cell.y:
+                block.move(cell.x - block.x, cell.y - block.y)
+            block.set_look(shape.color, Block.OUTLINE)
 
-            rotates the shape in the direction
-            specified by the value returned by
-            rotation_dir
+    def hide(self):
+        ''' makes the blocks invisible without erasing them
         '''
         for block in self.blocks:
-             x = (self.center_block.x - self.rotation_dir*self.center_block.y + self.rotation_dir*block.y) - block.x
-             y = (self.center_block.y + self.rotation_dir*self.center_block.x - self.rotation_dir*block.x) - block.y
-             block.move(x,y)
-             
-        if self.shift_rotation_dir :
-            self.rotation_dir *= -1
-        
-
-        
-
-############################################################
-# ALL SHAPE CLASSES
-############################################################
-
- 
-class I_shape(Shape):
-    def __init__(self, center):
-        coords = [Point(center.x - 1, center.y),
-                  Point(center.x    , center.y),
-                  Point(center.x + 1, center.y),
-                  Point(center.x + 2, center.y)]
-        Shape.__init__(self, coords, 'blue')
-        self.center_block = self.blocks[1]
-        self.rotation_dir = -1
-        self.shift_rotation_dir = True
-    
-class J_shape(Shape):
-    def __init__(self, center):
-        coords = [Point(center.x - 1, center.y),
-                  Point(center.x    , center.y),
-                  Point(center.x + 1, center.y),
-                  Point(center.x + 1, center.y + 1)]
-        Shape.__init__(self, coords, 'orange')
-        self.center_block = self.blocks[1]
-
-class L_shape(Shape):
-    def __init__(self, center):
-        coords = [Point(center.x - 1, center.y),
-                  Point(center.x    , center.y),
-                  Point(center.x + 1, center.y),
-                  Point(center.x - 1, center.y + 1)]
-        Shape.__init__(self, coords, 'cyan')
-        self.center_block = self.blocks[1]
-
-class O_shape(Shape):
-    def __init__(self, center):
-        coords = [Point(center.x    , center.y),
-                  Point(center.x - 1, center.y),
-                  Point(center.x    , center.y + 1),
-                  Point(center.x - 1, center.y + 1)]
-        Shape.__init__(self, coords, 'red')
-        self.center_block = self.blocks[0]
-
-    def can_rotate(self, board):
-        return False
-
-class S_shape(Shape):
-    def __init__(self, center):
-        coords = [Point(center.x    , center.y),
-                  Point(center.x    , center.y + 1),
-                  Point(center.x + 1, center.y),
-                  Point(center.x - 1, center.y + 1)]
-        Shape.__init__(self, coords, 'green')
-        self.center_block = self.blocks[0]
-        self.shift_rotation_dir = True
-
-class T_shape(Shape):
-    def __init__(self, center):
-        coords = [Point(center.x - 1, center.y),
-                  Point(center.x    , center.y),
-                  Point(center.x + 1, center.y),
-                  Point(center.x    , center.y + 1)]
-        Shape.__init__(self, coords, 'yellow')
-        self.center_block = self.blocks[1]
-
-class Z_shape(Shape):
-    def __init__(self, center):
-        coords = [Point(center.x - 1, center.y),
-                  Point(center.x    , center.y), 
-                  Point(center.x    , center.y + 1),
-                  Point(center.x + 1, center.y + 1)]
-        Shape.__init__(self, coords, 'magenta')
-        self.center_block = self.blocks[1]
-        self.shift_rotation_dir = True
+            block.set_look('', '')
 
 
 
 ############################################################
-# BOARD CLASS
+# BOARD VIEW CLASS
 ############################################################
 
-class Board(object):
-    ''' Board class: it represents the Tetris board
+class BoardView(object):
+    ''' BoardView class: it draws the Tetris board.
+        The state of the board is kept by tetris_engine.Board. The view
+        owns one block per square, made once and recolored from then on,
+        and one ShapeView that is moved onto each new current shape.
+        Each frame it works out how every square should look and only
+        recolors the squares that changed since the frame before
 
         Attributes: width - type:int - width of the board in squares
                     height - type:int - height of the board in squares
                     canvas - type:CanvasFrame - where the pieces will be drawn
-                    grid - type:Dictionary - keeps track of the current state of
-                    the board; stores the blocks for a given position
+                    grid - type:Dictionary - stores the block
+                    of each position
+                    looks - type:Dictionary - the (fill, outline) shown
+                    at each position that is not empty
+                    piece - type:ShapeView - the current shape, None until
+                    the first frame
+                    text - type:Text - the game over message, None until
+                    the first game over
     '''
-    
+
     def __init__(self, win, width, height):
         self.width = width
         self.height = height
@@ -257,130 +150,96 @@ class Board(object):
                                         self.height * Block.BLOCK_SIZE)
         self.canvas.setBackground('black')
 
-        # create an empty dictionary
+        # one invisible block for every square
         # currently we have no shapes on the board
         self.grid = {}
-
-    def draw_shape(self, shape):
-        ''' Parameters: shape - type: Shape
-            Return value: type: bool
-
-            draws the shape on the board if there is space for it
-            and returns True, otherwise it returns False
+        for y in range(self.height):
+            for x in range(self.width):
+                block = Block(tetris_engine.Cell(x, y), '')
+                block.setOutline('')
+                block.draw(self.canvas)
+                self.grid[(x, y)] = block
+        self.looks = {}
+        self.piece = None
+        self.text = None
+
+    def looks_of(self, engine):
+        ''' Parameter: engine - type: tetris_engine.TetrisEngine
+            Return value: type: Dictionary - (x, y) to (fill, outline)
+
+            how every square that is not empty should look: the blocks
+            on the board and the outline of where the current shape
+            would land. The current shape is drawn over them by piece
         '''
-        if shape.can_move(self, 0, 0):
-            shape.draw(self.canvas)
-            return True
-        return False
-
-    def can_move(self, x, y):
-        ''' Parameters: x - type:int
-                        y - type:int
-            Return value: type: bool
-
-            1. check if it is ok to move to square x,y
-            if the position is outside of the board boundaries, can't move there
-            return False
-
-            2. if there is already a block at that postion, can't move there
-            return False
-
-            3. otherwise return True
+        looks = {}
+        board = engine.board
+        colors = board.colors
+        for y in range(board.height):
+            if board.rows[y]:
+                start = y * board.width
+                for x in range(board.width):
+                    if colors[start + x]:
+                        looks[x, y] = (tetris_engine.COLORS[colors[start + x]],
+                                       Block.OUTLINE)
+
+        if not engine.over:
+            shape = engine.current_shape
+            dy = shape.drop_distance(board)
+            for cell in shape.get_blocks():
+                if cell.y + dy >= 0:
+                    looks[cell.x, cell.y + dy] = ('', shape.color)
+        return looks
+
+    def draw_frame(self, engine):
+        ''' Parameter: engine - type: tetris_engine.TetrisEngine
+
+            brings the canvas from the last frame up to date with engine:
+            recolors the squares whose look changed and moves the piece
+            onto the current shape. Nothing is created or erased
+        '''
+        looks = self.looks_of(engine)
+        old_looks = self.looks
+        for pos in old_looks:
+            if pos not in looks:
+                self.grid[pos].set_look('', '')
+        for pos, look in looks.items():
+            if old_looks.get(pos) != look:
+                self.grid[pos].set_look(*look)
+        self.looks = looks
+
+        if engine.over:
+            if self.piece is not None:
+                self.piece.hide()
+            return
+        if self.piece is None:
+            self.piece = ShapeView(engine.current_shape)
+            self.piece.draw(self.canvas)
+        self.piece.show(engine.current_shape)
+
+    def game_over(self, message='Game Over!'):
+        ''' Parameter: message - type: string
+
+            display "Game Over !!!" message in the center of the board.
+            The text is made on the first game over, above every
+            block, and reused after that
         '''
-        if x < 0 or x >= self.width or y >= self.height:
-            return False
-        elif (x,y) in self.grid:
-            return False
+        if self.text is None:
+            self.text = Text(Point(150,250), message)
+            self.text.setFace('arial')
+            self.text.setSize(36)
+            self.text.setTextColor('white')
+            self.text.setStyle('bold')
+            self.text.draw(self.canvas)
         else:
-            return True
+            self.text.setText(message)
 
-        
-
-    def add_shape(self, shape):
-        ''' Parameter: shape - type:Shape
-            
-            add a shape to the grid, i.e.
-            add each block to the grid using its
-            (x, y) coordinates as a dictionary key
-
-            Hint: use the get_blocks method onShape to
-            get the list of blocks
+    def clear_game_over(self):
+        ''' hides the game over message
         '''
-        for block in shape.get_blocks():
-            self.grid[(block.x, block.y)] = block
+        if self.text is not None:
+            self.text.setText('')
 
-    def delete_row(self, y):
-        ''' Parameters: y - type:int
-
-            delete all the blocks in row y from the grid
-            and erase them from the canvas
-        '''
-        for x in range(10):
-            block = self.grid[x,y]
-            block.undraw()
-            del self.grid[x,y]
-            
-    
-    def is_row_complete(self, y):        
-        ''' Parameter: y - type: int
-            Return value: type: bool
-
-            check if all the squares in row y are occupied.
-            return True if they are, False otherwise
-        '''
-        for x in range(0, 10) :
-            if (x, y) not in self.grid:
-                return False
-        return True
-    
-    def move_down_rows(self, y_start):
-        ''' Parameters: y_start - type:int                        
-
-            move all the blocks in each row starting at y_start and up
-            down 1 square
-            Note: make sure you update the grid as well.
-        '''
-        
-
-        for row in range(y_start, 0, -1):
-            for column in range(10):
-                if (column, row) in self.grid:
-                    block = self.grid[(column, row)]
-                    del self.grid[column, row]
-                    block.move(0,1)
-                    self.grid[(block.x, block.y)] = block
-                    
-    
-    def remove_complete_rows(self, score, scoreboard):
-        ''' removes all the complete rows
-            and moves all rows above them down
-        '''
-        for y in range(20):
-            if self.is_row_complete(y) == True:
-                self.delete_row(y)
-                self.move_down_rows(y - 1)
-                score += 1
-                scoreboard.update_score(score)
-        return score
-          
-
-                
-
-    def game_over(self):
-        ''' display "Game Over !!!" message in the center of the board
-            HINT: use the Tremove_complete_rows(seext class from the graphics library
-        '''
-        self.text = Text(Point(150,250), 'Game Over!')
-        self.text.setFace('arial')
-        self.text.setSize(36)
-        self.text.setTextColor('white')
-        self.text.setStyle('bold')
-        self.text.draw(self.canvas)
-        win = Window("WTP Tetris")
-        game = WTPTetris(win)
-        win.mainloop()
 
-    
 
 ############################################################
 # SCOREBOARD CLASS
@@ -393,10 +252,10 @@ class Scoreboard(object):
     '''
 
     def __init__(self, win, width, height, score):
-        self.width = width 
+        self.width = width
         self.height = height
         self.score = score
-        #self.level = 
+        #self.level =
 
         # create a canvas to draw the scoreboard on
         self.scoreboard = CanvasFrame(win,self.width * Block.BLOCK_SIZE,
@@ -420,57 +279,271 @@ class Scoreboard(object):
 
         self.text5 = Text(Point(230, 40), 1)
         self.text5.draw(self.scoreboard)
-        
+
+        # the timings overlay, made by the first show_timings
+        self.timings_text = None
+
 
     def update_score(self, score):
         self.text3.setText(score)
 
 
     def levels(self, score, delay):
-        if score < 10:
-            delay = 1000
-            self.text5.setText(1)
-        elif score >= 10 and score < 20:
-            delay = 800
-            self.text5.setText(2)
-        elif score >= 20 and score < 30:
-            delay = 600
-            self.text5.setText(3)
-        elif score >= 30 and score < 40:
-            delay = 400
-            self.text5.setText(4)
-        elif score >= 40 and score < 50:
-            delay = 200
-            self.text5.setText(5)
-        elif score >= 50 and score < 60:
-            delay = 100
-            self.text5.setText(6)
-
+        level, delay = tetris_engine.level_for_score(score)
+        self.text5.setText(level)
         return delay
-    
 
-        
-    
+    def show_timings(self, text):
+        ''' Parameter: text - type: string
+
+            shows text in small print under the score and level
+        '''
+        if self.timings_text is None:
+            self.timings_text = Text(Point(150, 54), '')
+            self.timings_text.setSize(8)
+            self.timings_text.draw(self.scoreboard)
+        self.timings_text.setText(text)
+
+
+
+
+
+############################################################
+# PREVIEW CLASS
+############################################################
+
+class Preview(object):
+    '''Preview class: shows the shapes that come next
+
+        Attributes: width - type:int - width of the preview in squares
+                    height - type:int - height of the preview in squares
+                    canvas - type:CanvasFrame - where the shapes are drawn
+                    shapes - type:list - the ShapeViews, made on the
+                    first show and moved onto the new shapes after that
+    '''
+
+    # squares between the centers of two shapes on show
+    SPACING = 5
+
+    def __init__(self, win, width, height):
+        self.width = width
+        self.height = height
+
+        self.canvas = CanvasFrame(win, self.width * Block.BLOCK_SIZE,
+                                       self.height * Block.BLOCK_SIZE)
+        self.canvas.setBackground('black')
+        self.shapes = []
+
+    def show(self, shape_classes):
+        ''' Parameter: shape_classes - type: list (list of Shape classes)
+
+            draws as many of the given shapes as fit, left to right
+        '''
+        shape_classes = shape_classes[:self.width // self.SPACING]
+        for i, shape_class in enumerate(shape_classes):
+            center = tetris_engine.Cell(self.SPACING * i + 2, self.height // 2 - 1)
+            shape = shape_class(center)
+            if i < len(self.shapes):
+                self.shapes[i].show(shape)
+            else:
+                view = ShapeView(shape)
+                view.draw(self.canvas)
+                self.shapes.append(view)
+        for view in self.shapes[len(shape_classes):]:
+            view.hide()
+
+
+
+############################################################
+# INPUT QUEUE CLASS
+############################################################
+
+# seconds from an arbitrary start. Python 2 has no monotonic clock, so
+# this is the wall clock there and can jump, e.g. when the system time
+# is corrected: the frame and gravity schedules resync when it does
+clock = getattr(time, 'monotonic', time.time)
+
+
+class InputQueue(object):
+    ''' InputQueue class: collects the key presses and releases between
+        two frames and turns them into game actions.
+        A held 'Left', 'Right' or 'Down' key repeats on its own: the first
+        move happens when the key goes down, the next one after a delay
+        (DAS) and then one every ARR seconds. Repeats that fell due since
+        the last frame are merged into one action, and the key repeat of
+        the keyboard itself is ignored. When 'Left' and 'Right' are both
+        down, the one pressed last wins: the other stops repeating until
+        it is released, and starts again, after a new DAS, if it is
+        still down when the last one is released
+        Attributes: events - type: list - (kind, key, stamp, when) of each
+                             event since the last drain: kind is 'press',
+                             'release' or 'release_all', stamp the time Tk
+                             gave the event and when the clock() time it
+                             arrived
+                    held - type: dictionary - for each key that is down,
+                           the clock() time of its next repeat
+                    paused - type: set - the keys that are down but do not
+                             repeat, because the opposite key was pressed
+                             after them
+    '''
+
+    KEYS = ('Left', 'Right', 'Down', 'Up', 'space', 'Return')
+    # (DAS, ARR) in seconds for the keys that repeat
+    REPEAT = {'Left': (0.17, 0.05), 'Right': (0.17, 0.05), 'Down': (0.05, 0.05)}
+    OPPOSITE = {'Left': 'Right', 'Right': 'Left'}
+
+    def __init__(self):
+        self.events = []
+        self.held = {}
+        self.paused = set()
+
+    def push(self, kind, key, stamp, when):
+        ''' Parameters: kind - type: string - 'press' or 'release'
+                        key - type: string - the keysym
+                        stamp - the time of the Tk event, or None
+                        when - type: float - clock() when it arrived
+
+            queues a key event until the next drain. Keys the game
+            does not use are dropped
+        '''
+        if key in self.KEYS:
+            self.events.append((kind, key, stamp, when))
+
+    def release_all(self, when):
+        ''' Parameter: when - type: float - clock() time
+
+            queues the release of every key that is down, e.g. when the
+            window loses the focus and will not see the keys go up
+        '''
+        self.events.append(('release_all', None, None, when))
+
+    def drain(self, now):
+        ''' Parameter: now - type: float - clock() at the start of the frame
+            Return value: type: list - of [key, count], the actions to
+                          apply in order; count is how many times in a row
+
+            empties the queue and returns the actions it adds up to,
+            including the repeats of the held keys up to now
+        '''
+        actions = []
+        events = self.events
+        self.events = []
+        held = self.held
+        i = 0
+        while i < len(events):
+            kind, key, stamp, when = events[i]
+            i += 1
+            if kind == 'press':
+                # a key that is already down is the keyboard repeating it
+                if key not in held:
+                    opposite = self.OPPOSITE.get(key)
+                    if opposite in held:
+                        self.repeat(actions, opposite, when)
+                        self.paused.add(opposite)
+                    delay = self.REPEAT.get(key, (None, None))[0]
+                    held[key] = delay is not None and when + delay
+                    self.add(actions, key, 1)
+            elif kind == 'release_all':
+                for key in held.keys():
+                    self.repeat(actions, key, when)
+                held.clear()
+                self.paused.clear()
+            elif key in held:
+                # on X11 the keyboard repeat sends a release and a press
+                # with the same stamp; the key is still down
+                if (stamp is not None and i < len(events) and
+                    events[i][:3] == ('press', key, stamp)):
+                    i += 1
+                    continue
+                self.repeat(actions, key, when)
+                del held[key]
+                self.paused.discard(key)
+                opposite = self.OPPOSITE.get(key)
+                if opposite in self.paused:
+                    self.paused.remove(opposite)
+                    held[opposite] = when + self.REPEAT[opposite][0]
+
+        for key in held:
+            self.repeat(actions, key, now)
+        return actions
+
+    def repeat(self, actions, key, now):
+        ''' Parameters: actions - type: list - of [key, count]
+                        key - type: string - a key that is down
+                        now - type: float - clock() time
+
+            adds the repeats of key that fell due by now
+        '''
+        due = self.held[key]
+        if due is False or due > now or key in self.paused:
+            return
+        arr = self.REPEAT[key][1]
+        count = int((now - due) / arr) + 1
+        self.held[key] = due + count * arr
+        self.add(actions, key, count)
+
+    def add(self, actions, key, count):
+        ''' Parameters: actions - type: list - of [key, count]
+                        key - type: string
+                        count - type: int
+
+            adds an action, merging it into the last one if it is
+            the same key
+        '''
+        if actions and actions[-1][0] == key:
+            actions[-1][1] += count
+        else:
+            actions.append([key, count])
+
+
 
 ############################################################
 # WTP TETRIS CLASS
 ############################################################
 
 class WTPTetris(object):
-    ''' WTPTetris class: Controls the game play
+    ''' WTPTetris class: Controls the game play.
+        The rules are run by a tetris_engine.TetrisEngine, this class
+        draws its state and feeds it the keyboard and timer events
         Attributes:
             SHAPES - type: list (list of Shape classes)
             DIRECTION - type: dictionary - converts string direction to (dx, dy)
             BOARD_WIDTH - type:int - the width of the board
             BOARD_HEIGHT - type:int - the height of the board
-            board - type:Board - the tetris board
+            engine - type:TetrisEngine - the game rules and state
+            board - type:BoardView - the tetris board
             win - type:Window - the window for the tetris game
             delay - type:int - the speed in milliseconds for moving the shapes
-            current_shapes - type: Shape - the current moving shape on the board
+            preview - type:Preview - shows the shapes that come next
+            input - type:InputQueue - the keys pressed since the last frame
+            next_drop - type:float - the clock() time the shape is due to
+                        move down next
+            next_frame - type:float - the clock() time the next frame is due
+            dirty - type:bool - whether the engine changed since the last
+                    frame was drawn
+            shown - type: dictionary - the score, level, preview shapes
+                    and game over state on show
+            player - type: AIPlayer - plays the game when set, None for
+                     a human player
+            seed - type:int - the seed of the shapes of this game
+            start_time - type:float - the clock() time the game started
+            replay - type:tetris_replay.Replay - records this game, None
+                     while playing one back
+            record_dir - type:string - where to save the replay of each
+                         finished game, or None
+            playback - type:tetris_replay.Replay - the replay being played
+                       back in real time, or None
+            playback_pos - type:int - the next action of playback
+            timings - type:tetris_timing.Timings - records how long each
+                      part of a frame takes, or None
+            overlay - type:bool - whether the timings are shown on the
+                      scoreboard
+            next_overlay - type:float - the clock() time the overlay is
+                           due to be updated
     '''
-    
-    SHAPES = [I_shape, J_shape, L_shape, O_shape, S_shape, T_shape, Z_shape]
-    DIRECTION = {'Left':(-1, 0), 'Right':(1, 0), 'Down':(0, 1),}
+
+    SHAPES = tetris_engine.TetrisEngine.SHAPES
+    DIRECTION = tetris_engine.TetrisEngine.DIRECTION
     BOARD_WIDTH = 10
     BOARD_HEIGHT = 20
     SCOREBOARD_WIDTH = 10
@@ -479,148 +552,404 @@ class WTPTetris(object):
     PREVIEW_WIDTH = 10
     PREVIEW_HEIGHT = 5
 
-    
-    def __init__(self, win):
-        self.board = Board(win, self.BOARD_WIDTH, self.BOARD_HEIGHT)
+    # how long the player waits before moving a new shape, in ms
+    AI_DELAY = 50
+
+    # ms between two frames: the keys pressed are applied and the
+    # changes drawn once per frame
+    FRAME_DELAY = 16
+
+    # the message shown when the game is over; 'Return' starts a new game
+    GAME_OVER = 'Game Over!\nPress Enter'
+    # how long a game played by the computer stays over, in ms
+    RESTART_DELAY = 3000
+
+    # the most gravity steps a late frame catches up on; a frame later
+    # than that (e.g. after the computer slept) starts counting again
+    MAX_CATCH_UP = 10
+
+    # the sections of the timings overlay, and how often it is
+    # updated, in seconds
+    OVERLAY_SECTIONS = ['frame', 'render', 'late']
+    OVERLAY_DELAY = 1.0
+
+
+    # how many upcoming shapes the engine deals ahead
+    PREVIEW_SHAPES = 2
+
+    def __init__(self, win, player=None, record_dir=None, playback=None,
+                 timings=None, overlay=False):
+        self.player = player
+        self.timings = timings
+        self.overlay = overlay and timings is not None
+        self.record_dir = record_dir
+        self.playback = playback
+        self.playback_pos = 0
+        if playback is not None:
+            self.seed = playback.seed
+            self.replay = None
+            self.engine = playback.new_engine()
+        else:
+            self.seed = random.randrange(1 << 32)
+            self.replay = tetris_replay.Replay(self.seed, self.BOARD_WIDTH, self.BOARD_HEIGHT,
+                                               False, self.PREVIEW_SHAPES)
+            self.engine = tetris_engine.TetrisEngine(self.BOARD_WIDTH, self.BOARD_HEIGHT,
+                                                     self.seed, preview=self.PREVIEW_SHAPES)
+        self.engine.timings = timings
+        self.board = BoardView(win, self.BOARD_WIDTH, self.BOARD_HEIGHT)
         self.win = win
          #creating scoreboard
         self.score = 0
         self.delay = 1000
         self.scoreboard = Scoreboard(win, self.SCOREBOARD_WIDTH,
                                      self.SCOREBOARD_HEIGHT, self.score)
- 
-        
+
+
         self.delay = self.scoreboard.levels(self.score, 1000) #ms
 
+        self.preview = Preview(win, self.PREVIEW_WIDTH, self.PREVIEW_HEIGHT)
+        self.input = InputQueue()
+        self.dirty = False
+        self.shown = {'score': self.score, 'level': self.engine.level,
+                      'preview': None, 'over': False}
+
         # sets up the keyboard events
-        # when a key is called the method key_pressed will be called
-        self.win.bind_all('<Key>', self.key_pressed)
-
-        # set the current shape to a random new shape
-        self.current_shape = self.create_new_shape()
-        self.current_shape.draw(self.board.canvas)
-        self.animate_shape()
-
- 
-
-
-    def create_new_shape(self):
-        ''' Return value: type: Shape
-            
-            create a random new shape that is centered
-            at the top center of the board
-            return the shape
-        '''
-        rand = random.randint(1,7)
-        if rand == 1:
-            return I_shape(Point(4,0))
-        if rand == 2:
-            return J_shape(Point(4,0))
-        if rand == 3:
-            return L_shape(Point(4,0))
-        if rand == 4:
-            return O_shape(Point(4,0))
-        if rand == 5:
-            return S_shape(Point(4,0))
-        if rand == 6:
-            return T_shape(Point(4,0))
-        if rand == 7:
-            return Z_shape(Point(4,0))
-    
-    def animate_shape(self):
-        ''' animate the shape - move down at equal intervals
-            specified by the delay attribute
-        '''
-        self.delay = self.scoreboard.levels(self.score, self.delay)
-        
-        self.do_move('Down')
-        self.win.after(self.delay, self.animate_shape)
-    
+        # when a key is pressed or released, key_pressed or key_released
+        # will queue it for the next frame
+        self.win.bind_all('<KeyPress>', self.key_pressed)
+        self.win.bind_all('<KeyRelease>', self.key_released)
+        # keys let go while the window is not focused send no release
+        self.win.bind('<FocusOut>', self.focus_lost)
+
+        # draw the shape the engine started with
+        self.start_shape()
+        now = clock()
+        self.start_time = now
+        self.next_drop = now
+        self.next_overlay = now
+        if playback is None:
+            self.animate_shape(now)
+        self.next_frame = now
+        self.schedule_frame(now)
+
+    def animate_shape(self, now):
+        ''' Parameter: now - type: float - clock() time
+
+            animate the shape - move down at equal intervals
+            specified by the delay attribute.
+            The moves are due at fixed times, so the time spent on a
+            frame does not add up: every move that fell due by now is
+            made, up to MAX_CATCH_UP of them. If the next move is due
+            later than one delay from now, the clock went back and the
+            moves start counting again from now.
+            Nothing moves once the game is over
+        '''
+        if self.engine.over:
+            return
+        if self.next_drop > now + self.delay / 1000.0:
+            self.next_drop = now + self.delay / 1000.0
+        moves = 0
+        while self.next_drop <= now and moves < self.MAX_CATCH_UP:
+            self.do_move('Down')
+            self.delay = self.engine.delay
+            self.next_drop += self.delay / 1000.0
+            moves += 1
+        if self.next_drop <= now:
+            self.next_drop = now + self.delay / 1000.0
+
     def do_move(self, direction):
         ''' Parameters: direction - type: string
-            Return value: type: bool
-
-            Move the current shape in the direction specified by the parameter:
-            First check if the shape can move. If it can, move it and return True
-            Otherwise if the direction we tried to move was 'Down',
-            1. add the current shape to the board
-            2. remove the completed rows if any 
-            3. create a new random shape and set current_shape attribute
-            4. If the shape cannot be drawn on the board, display a
-               game over message
-
-            return False
-        '''
-    
-        if direction == 'space':
-            while self.current_shape.can_move(self.board, 0,1) == True:
-                self.do_move('Down')
-            self.board.add_shape(self.current_shape)
-            self.current_shape = self.create_new_shape()
-            if not self.board.draw_shape(self.current_shape):
-                self.board.game_over()
-                return False
-            self.score = self.board.remove_complete_rows(self.score, self.scoreboard)
-            return self.current_shape
-
-        #accesses dictionary to find the proper direction to move the shape
-        self.direction = self.DIRECTION[direction]
-
-        if self.current_shape.can_move(self.board, self.direction[0], self.direction[1]) == True:
-            #moves the shape
-            self.current_shape.move(self.direction[0],self.direction[1])
-            return True
-
-        elif direction == 'Down':
-            self.board.add_shape(self.current_shape)
-            self.current_shape = self.create_new_shape()
-            if not self.board.draw_shape(self.current_shape):
-                self.board.game_over()
-                return False
-            self.score = self.board.remove_complete_rows(self.score, self.scoreboard)
-            return self.current_shape
-
-                
+
+            Move the current shape in the direction specified by the parameter,
+            the result is drawn by the next frame. Once the game is over
+            the move is neither made nor recorded
+        '''
+        if self.engine.over:
+            return
+        timings = self.timings
+        if timings is not None:
+            start = timings.clock()
+        self.engine.step(direction)
+        self.record(direction)
+        self.after_step()
+        if timings is not None:
+            timings.add('do_move', timings.clock() - start)
+
     def do_rotate(self):
-        ''' Checks if the current_shape can be rotated and
-            rotates if it can
+        ''' Rotates the current_shape if it can be rotated,
+            the result is drawn by the next frame
+        '''
+        if self.engine.over:
+            return
+        self.engine.step('Up')
+        self.record('Up')
+        self.after_step()
+
+    def do_action(self, key, count=1):
+        ''' Parameters: key - type: string - 'Up' rotates, any other key moves
+                        count - type: int
+
+            makes the move count times, stopping early if the shape lands.
+            When the game is over, 'Return' starts a new one
+        '''
+        if self.engine.over:
+            if key == 'Return':
+                self.restart()
+            return
+        for i in range(count):
+            if key == 'Up':
+                self.do_rotate()
+            else:
+                self.do_move(key)
+            if self.engine.locked_shape is not None or self.engine.over:
+                return
+
+    def after_step(self):
+        ''' called after every engine step: starts the new shape
+            if the last one landed and marks the frame dirty.
+            Nothing is drawn here, so a burst of steps is drawn once
+        '''
+        engine = self.engine
+        if engine.locked_shape is not None:
+            if engine.over:
+                self.end_game()
+            else:
+                self.start_shape()
+        self.dirty = True
+
+    def record(self, action):
+        ''' Parameter: action - type: string - the action the engine just took
+
+            adds the action to the replay of the game, if it is recorded
+        '''
+        if self.replay is not None:
+            # not before the start, even if the clock went back
+            self.replay.record(max(0, int((clock() - self.start_time) * 1000)), action)
+
+    def end_game(self):
+        ''' called when the game is over: saves its replay to
+            record_dir, if set
+        '''
+        if self.replay is not None and self.record_dir is not None:
+            self.replay.finish(self.engine)
+            filename = '%d-%d.wtpr' % (time.time(), self.seed)
+            self.replay.save(os.path.join(self.record_dir, filename))
+
+    def start_shape(self):
+        ''' marks the frame dirty for the new current shape of the engine
+            and, if a player is set, asks it where to put the shape
+        '''
+        self.dirty = True
+        if self.player is not None:
+            self.win.after(self.AI_DELAY, self.play_ai, self.engine.current_shape)
+
+    def reset(self):
+        ''' starts a new game in the same window, reusing the canvases
+            and their blocks; the next frame draws the empty board
         '''
-        if self.current_shape.can_rotate(self.board):
-            self.current_shape.rotate(self.board)
-    
+        self.seed = random.randrange(1 << 32)
+        self.engine.reset(self.seed)
+        self.playback = None
+        self.replay = tetris_replay.Replay(self.seed, self.BOARD_WIDTH, self.BOARD_HEIGHT,
+                                           False, self.PREVIEW_SHAPES)
+        self.start_time = clock()
+        self.next_drop = self.start_time
+        self.animate_shape(self.start_time)
+        self.start_shape()
+
+    def restart(self):
+        ''' starts a new game if this one is over
+        '''
+        if self.engine.over:
+            self.reset()
+
+    def run_frame(self):
+        ''' called every FRAME_DELAY ms: applies the keys pressed since
+            the last frame, then the gravity moves that fell due, and
+            draws the result if anything changed.
+            With timings set, records how long the frame and its parts
+            took, and how late the frame started ('late')
+        '''
+        now = clock()
+        timings = self.timings
+        if timings is not None:
+            start = timings.clock()
+            timings.add('late', max(0.0, now - self.next_frame))
+        actions = self.timed('input', self.input.drain, now)
+        if self.playback is not None and not self.engine.over:
+            self.play_back(now)
+        else:
+            # once a replay has ended, the keys work as after any
+            # game, so 'Return' starts a new one
+            for key, count in actions:
+                self.do_action(key, count)
+            self.timed('animate_shape', self.animate_shape, now)
+        if self.dirty:
+            self.timed('render', self.draw_frame)
+        if timings is not None:
+            timings.add('frame', timings.clock() - start)
+            if self.overlay and now >= self.next_overlay:
+                self.next_overlay = now + self.OVERLAY_DELAY
+                self.scoreboard.show_timings(timings.overlay_text(self.OVERLAY_SECTIONS))
+        self.schedule_frame(clock())
+
+    def timed(self, name, function, *args):
+        ''' Parameters: name - type: string - the section of timings
+                        function - type: function - called with args
+            Return value: what function returns
+
+            calls function and, if timings is set, records how long it took
+        '''
+        timings = self.timings
+        if timings is None:
+            return function(*args)
+        start = timings.clock()
+        result = function(*args)
+        timings.add(name, timings.clock() - start)
+        return result
+
+    def play_back(self, now):
+        ''' Parameter: now - type: float - clock() time
+
+            applies the actions of playback that fell due by now,
+            at the same time into the game as they were recorded
+        '''
+        playback = self.playback
+        elapsed = (now - self.start_time) * 1000
+        while (self.playback_pos < len(playback.codes) and
+               playback.ticks[self.playback_pos] <= elapsed):
+            action = tetris_replay.ACTIONS[playback.codes[self.playback_pos]]
+            self.playback_pos += 1
+            if action == 'Up':
+                self.do_rotate()
+            else:
+                self.do_move(action)
+
+    def schedule_frame(self, now):
+        ''' Parameter: now - type: float - clock() time
+
+            schedules run_frame FRAME_DELAY ms after the last frame was
+            due, rather than after it ended. Frames that are already
+            too late are skipped, and if the clock went back the frames
+            start counting again from now
+        '''
+        self.next_frame += self.FRAME_DELAY / 1000.0
+        if self.next_frame < now or self.next_frame > now + self.FRAME_DELAY / 1000.0:
+            self.next_frame = now
+        self.win.after(int((self.next_frame - now) * 1000), self.run_frame)
+
+    def draw_frame(self):
+        ''' brings the canvases up to date with the engine:
+            1. redraw the squares of the board that changed
+            2. update the score, level and preview if they changed
+            3. if the game is over, display a game over message
+        '''
+        self.dirty = False
+        engine = self.engine
+        shown = self.shown
+        self.board.draw_frame(engine)
+
+        if shown['score'] != engine.score:
+            self.score = shown['score'] = engine.score
+            self.scoreboard.update_score(self.score)
+        if shown['level'] != engine.level:
+            shown['level'] = engine.level
+            self.scoreboard.levels(engine.score, engine.delay)
+        next_shapes = engine.next_shapes()
+        if shown['preview'] != next_shapes:
+            shown['preview'] = next_shapes
+            self.preview.show(next_shapes)
+
+        if engine.over != shown['over']:
+            shown['over'] = engine.over
+            if engine.over:
+                self.board.game_over(self.GAME_OVER)
+                if self.player is not None:
+                    self.win.after(self.RESTART_DELAY, self.restart)
+            else:
+                self.board.clear_game_over()
+
+    def play_ai(self, shape):
+        ''' Parameter: shape - type: tetris_engine.Shape
+
+            asks the player where to put shape and makes the moves
+            through do_rotate and do_move. Does nothing if shape
+            has already landed
+        '''
+        if self.engine.over or shape is not self.engine.current_shape:
+            return
+        for action in self.player.choose(self.engine.board, shape,
+                                         self.engine.next_shapes()):
+            if action == 'Up':
+                self.do_rotate()
+            else:
+                self.do_move(action)
+
     def key_pressed(self, event):
-        ''' this function is called when a key is pressed on the keyboard
-            it currenly just prints the value of the key
+        ''' this function is called when a key is pressed on the keyboard.
+            The key is queued and applied by the next frame:
 
-            Modify the function so that if the user presses the arrow keys
+            if the user presses the arrow keys
             'Left', 'Right' or 'Down', the current_shape will move in
-            the appropriate direction
+            the appropriate direction, and keep moving while the key is held
 
             if the user presses the space bar 'space', the shape will move
             down until it can no longer move and is added to the board
 
             if the user presses the 'Up' arrow key ,
                 the shape should rotate.
+
+            once the game is over, 'Return' starts a new game
         '''
-        key = event.keysym
+        self.input.push('press', event.keysym, getattr(event, 'time', None), clock())
+
+    def key_released(self, event):
+        ''' this function is called when a key is released,
+            it stops the key from repeating
+        '''
+        self.input.push('release', event.keysym, getattr(event, 'time', None), clock())
+
+    def focus_lost(self, event):
+        ''' this function is called when the window loses the focus,
+            it stops every held key from repeating
+        '''
+        self.input.release_all(clock())
 
-        if key == 'Up':
-            self.do_rotate()
 
-        #calls the do_move function for the variable 'key', which corresponds to
-        #to the key that was pressed'''
 
-        else:
-            self.do_move(key)
 
-        
 
-        
-       
 ################################################################
 # Start the game
 ################################################################
 
-win = Window("WTP Tetris")
-game = WTPTetris(win)
-win.mainloop()
+if __name__ == "__main__":
+    # start with --ai to watch the computer play,
+    # --record DIR to save a replay of every game to DIR
+    # and --replay FILE to watch a saved game.
+    # --timings FILE writes how long the parts of each frame took
+    # to FILE when the window is closed, --overlay shows them
+    # on the scoreboard
+    player = None
+    if '--ai' in sys.argv:
+        player = tetris_ai.AIPlayer()
+    record_dir = None
+    if '--record' in sys.argv:
+        record_dir = sys.argv[sys.argv.index('--record') + 1]
+    playback = None
+    if '--replay' in sys.argv:
+        playback = tetris_replay.load(sys.argv[sys.argv.index('--replay') + 1])
+
+    timings_file = None
+    if '--timings' in sys.argv:
+        timings_file = sys.argv[sys.argv.index('--timings') + 1]
+    overlay = '--overlay' in sys.argv
+    timings = None
+    if timings_file is not None or overlay:
+        timings = tetris_timing.Timings()
+
+    win = Window("WTP Tetris")
+    game = WTPTetris(win, player, record_dir, playback, timings, overlay)
+    win.mainloop()
+    if timings_file is not None:
+        timings.dump(timings_file)